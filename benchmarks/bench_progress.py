@@ -0,0 +1,79 @@
+"""
+Per-chunk cost of progress reporting on the transfer path: a tqdm bar
+updated under a lock from every worker thread (the old shared-bar approach)
+against `ProgressRenderer` tasks drawn by a render thread.
+
+    python -m benchmarks.bench_progress --threads 8 --chunks 200000
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from contextlib import redirect_stderr
+
+from tqdm import tqdm
+
+from core.services.progress import ProgressRenderer
+
+
+def _run_threads(threads: int, target):
+    workers = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+    start_time = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start_time
+
+
+def bench_locked_tqdm(threads: int, chunks: int, chunk_size: int):
+    lock = threading.Lock()
+    bar = tqdm(total=threads * chunks * chunk_size, unit='B', unit_scale=True, desc="locked")
+
+    def worker(i):
+        for _ in range(chunks):
+            with lock:
+                bar.update(chunk_size)
+
+    elapsed = _run_threads(threads, worker)
+    bar.close()
+    return elapsed
+
+
+def bench_renderer(threads: int, chunks: int, chunk_size: int):
+    progress = ProgressRenderer(total=threads * chunks * chunk_size, desc="renderer", max_bars=threads)
+
+    def worker(i):
+        with progress.task(f"item {i}", chunks * chunk_size) as task:
+            for _ in range(chunks):
+                task.update(chunk_size)
+
+    elapsed = _run_threads(threads, worker)
+    progress.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="concurrent transfer threads")
+    parser.add_argument("--chunks", type=int, default=200000, help="progress callbacks per thread")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024, help="bytes reported per callback")
+    args = parser.parse_args()
+
+    results = {}
+    # Vẽ ra /dev/null để chỉ đo chi phí trên luồng tải, không phải tốc độ terminal
+    with open(os.devnull, "w") as devnull, redirect_stderr(devnull):
+        for name, bench in (("locked tqdm", bench_locked_tqdm), ("renderer", bench_renderer)):
+            results[name] = bench(args.threads, args.chunks, args.chunk_size)
+
+    total = args.threads * args.chunks
+    print(f"{args.threads} threads x {args.chunks} chunks")
+    for name, elapsed in results.items():
+        print(f"{name:<12} {elapsed:>7.3f}s {1e9 * elapsed / total:>8.0f} ns/chunk")
+    print(f"speed-up: {results['locked tqdm'] / results['renderer']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Compare pytubefix's single-stream `Stream.download` with the transfer
+engine on one and on several connections, against a local,
+per-connection throttled server.
+
+    python -m benchmarks.bench_segmented --size 64 --bandwidth 4 --connections 4
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from pytubefix.monostate import Monostate
+from pytubefix.streams import Stream
+
+from core.services.engine import AsyncTransferEngine
+from .local_server import LocalStreamServer
+
+
+def _make_stream(url: str, size: int):
+    raw = {
+        "url": url,
+        "itag": 18,
+        "mimeType": 'video/mp4; codecs="avc1.42001E, mp4a.40.2"',
+        "is_otf": False,
+        "bitrate": 500000,
+        "contentLength": str(size),
+        "approxDurationMs": "1000",
+        "lastModified": "0",
+    }
+    return Stream(raw, Monostate(None, None, title="benchmark", duration=1), None, None)
+
+
+def _timed(name: str, size: int, payload: bytes, file_path: str, run):
+    start_time = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start_time
+    with open(file_path, "rb") as f:
+        ok = f.read() == payload
+    os.remove(file_path)
+    print(f"{name:<28} {elapsed:8.2f}s {size / elapsed / 1024 / 1024:8.2f} MB/s  {'OK' if ok else 'MISMATCH'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=float, default=64, help="stream size in MB")
+    parser.add_argument("--bandwidth", type=float, default=4, help="per-connection cap in MB/s (0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0.05, help="per-request latency in seconds")
+    parser.add_argument("--connections", type=int, default=4)
+    args = parser.parse_args()
+
+    size = int(args.size * 1024 * 1024)
+    bandwidth = args.bandwidth * 1024 * 1024 or None
+    with LocalStreamServer(size, bandwidth=bandwidth, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as folder:
+        print(f"Stream: {args.size} MB, {args.bandwidth} MB/s per connection, {args.latency}s latency")
+        file_path = os.path.join(folder, "benchmark.mp4")
+
+        ds = _make_stream(server.url, size)
+        engine = AsyncTransferEngine()
+        try:
+            _timed("pytubefix Stream.download", size, server.payload, file_path,
+                   lambda: ds.download(output_path=folder, filename="benchmark.mp4"))
+            _timed("engine (1 connection)", size, server.payload, file_path,
+                   lambda: engine.download(server.url, file_path, size))
+            _timed(f"engine ({args.connections} connections)", size, server.payload, file_path,
+                   lambda: engine.download(server.url, file_path, size, connections=args.connections))
+        finally:
+            engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+End-to-end benchmark of `DownloadService` against a fake YouTube backend.
+
+Each workload runs in its own child process with a fresh project folder,
+so peak RSS and CPU time belong to the downloader alone (the stream server
+stays in the parent). Results are written as JSON tagged with the git
+commit, so runs can be compared across commits:
+
+    python -m benchmarks.bench_service --count 50 --size 4 --bandwidth 2
+    python -m benchmarks.bench_service --output after.json --baseline before.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+from .local_server import LocalStreamServer
+from .fake_youtube import FakeBackend
+
+WORKLOADS = ("single", "keyword", "playlist")
+MB = 1024 * 1024
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _targets(workload: str, count: int):
+    if workload == "single":
+        return [("url", "https://www.youtube.com/watch?v=s0000000000")], None
+    if workload == "keyword":
+        return [("keyword", "benchmark")], count
+    return [("playlist", "https://www.youtube.com/playlist?list=PLbenchmark")], None
+
+
+def run_child(spec: dict):
+    """Run one workload in this process and return its measurements."""
+    os.chdir(spec["workdir"])
+    os.makedirs("youtube_downloader_projects", exist_ok=True)
+    with open(os.path.join("youtube_downloader_projects", "config.json"), "w") as f:
+        json.dump(spec["config"], f)
+
+    from core.services.download import DownloadService
+
+    backend = FakeBackend(**spec["backend"])
+    with backend.installed():
+        service = DownloadService()
+        targets, keyword_limit = _targets(spec["workload"], spec["count"])
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        start_time = time.perf_counter()
+        summary = service.download_targets(targets, "video", keyword_limit=keyword_limit, show_progress=False)
+        elapsed = time.perf_counter() - start_time
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    downloaded = summary["metrics"]["bytes"]
+    return {
+        "workload": spec["workload"],
+        "items": summary["total"],
+        "succeeded": summary["succeeded"],
+        "failed": summary["failed"],
+        "elapsed_s": round(elapsed, 3),
+        "items_per_s": round(summary["succeeded"] / elapsed, 3),
+        "mb_per_s": round(downloaded / elapsed / MB, 3),
+        "bytes": downloaded,
+        # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+        "peak_rss_mb": round(usage_after.ru_maxrss / (MB if sys.platform == "darwin" else 1024), 1),
+        "cpu_s": round(cpu, 3),
+        "cpu_percent": round(100 * cpu / elapsed, 1),
+        "resolve_p95_s": summary["metrics"]["resolve_p95_s"],
+        "ttfb_p95_s": summary["metrics"]["ttfb_p95_s"],
+    }
+
+
+def _run_workload(workload: str, args, server: LocalStreamServer):
+    size = int(args.size * MB) if workload != "single" else int(args.single_size * MB)
+    with tempfile.TemporaryDirectory() as workdir:
+        spec = {
+            "workload": workload,
+            "workdir": workdir,
+            "count": args.count,
+            "config": {
+                "max_workers": args.workers,
+                # Luồng tổng hợp không phải media thật, nên tắt bước ffmpeg
+                "media_pipeline": {"adaptive_video": False, "transcode_audio": False},
+                "segmented_download": {"enabled": args.segmented},
+                "metrics": {"jsonl": False, "prometheus": False},
+                "governor": {"max_bandwidth": int(args.max_bandwidth * MB)},
+            },
+            "backend": {
+                "server_url": server.url,
+                "video_size": size,
+                "resolve_latency": args.resolve_latency,
+                "page_latency": args.page_latency,
+                "playlist_size": args.count,
+            },
+        }
+        # Thư mục gốc của repo để tiến trình con import được `core`
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_service", "--child", json.dumps(spec)],
+            cwd=repo_root, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"{workload} thất bại:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _print_results(results: list, baseline: dict = None):
+    previous = {r["workload"]: r for r in (baseline or {}).get("results", [])}
+    print(f"{'workload':<10} {'items':>6} {'failed':>6} {'time':>8} {'items/s':>9} {'MB/s':>8} {'RSS MB':>8} {'CPU %':>7}")
+    for r in results:
+        print(f"{r['workload']:<10} {r['items']:>6} {r['failed']:>6} {r['elapsed_s']:>7.2f}s "
+              f"{r['items_per_s']:>9.2f} {r['mb_per_s']:>8.2f} {r['peak_rss_mb']:>8.1f} {r['cpu_percent']:>7.1f}")
+        before = previous.get(r["workload"])
+        if before and before["mb_per_s"]:
+            print(f"{'':<10} vs {baseline.get('commit') or 'baseline'}: "
+                  f"MB/s {100 * (r['mb_per_s'] / before['mb_per_s'] - 1):+.1f}%, "
+                  f"RSS {r['peak_rss_mb'] - before['peak_rss_mb']:+.1f} MB, "
+                  f"CPU {r['cpu_s'] - before['cpu_s']:+.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", choices=WORKLOADS, action="append", help="workloads to run (default: all)")
+    parser.add_argument("--count", type=int, default=50, help="videos per keyword/playlist workload")
+    parser.add_argument("--size", type=float, default=4, help="video size in MB for batch workloads")
+    parser.add_argument("--single-size", type=float, default=64, help="video size in MB for the single workload")
+    parser.add_argument("--bandwidth", type=float, default=2, help="per-connection cap in MB/s (0 = unlimited)")
+    parser.add_argument("--latency", type=float, default=0.05, help="per-request latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of stream requests that fail")
+    parser.add_argument("--resolve-latency", type=float, default=0.2, help="fake metadata request latency in seconds")
+    parser.add_argument("--page-latency", type=float, default=0.3, help="fake search/playlist page latency in seconds")
+    parser.add_argument("--workers", type=int, default=4, help="max_workers for DownloadService")
+    parser.add_argument("--segmented", action="store_true", help="enable segmented downloads")
+    parser.add_argument("--max-bandwidth", type=float, default=0, help="global bandwidth cap in MB/s (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(json.loads(args.child))))
+        return
+
+    bandwidth = args.bandwidth * MB or None
+    results = []
+    with LocalStreamServer(0, bandwidth=bandwidth, latency=args.latency,
+                           failure_rate=args.failure_rate, seed=args.seed) as server:
+        for workload in args.workload or WORKLOADS:
+            results.append(_run_workload(workload, args, server))
+        server_stats = server.stats
+
+    report = {
+        "commit": _git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("child", "output", "baseline")},
+        "server": server_stats,
+        "results": results,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(f"Commit {report['commit']}, {args.count} videos x {args.size} MB, {args.bandwidth} MB/s per connection, "
+          f"failure rate {args.failure_rate}")
+    _print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
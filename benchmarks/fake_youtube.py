@@ -0,0 +1,168 @@
+"""
+Offline stand-ins for pytubefix's `YouTube`, `Search` and `Playlist`.
+
+Videos are synthetic: their streams point at a `LocalStreamServer`, which
+serves `clen` bytes for each of them. Metadata and page requests sleep for
+a configurable latency instead of talking to YouTube.
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+from pytubefix import extract
+from pytubefix.monostate import Monostate
+from pytubefix.streams import Stream
+
+
+class FakeBackend:
+    """
+    Shape of the fake catalogue: stream sizes, metadata latency and the size
+    of search results and playlists.
+    """
+
+    def __init__(self, server_url: str, video_size: int, audio_size: int = None,
+                 resolve_latency: float = 0.0, page_latency: float = 0.0,
+                 search_results: int = 1000, search_page_size: int = 20,
+                 playlist_size: int = 100, playlist_page_size: int = 100):
+        self.server_url = server_url
+        self.video_size = video_size
+        self.audio_size = audio_size or max(1, video_size // 4)
+        self.resolve_latency = resolve_latency
+        # Số yêu cầu player đã gửi, để đo chi phí phân giải
+        self.player_requests = 0
+        self._lock = threading.Lock()
+        self.page_latency = page_latency
+        self.search_results = search_results
+        self.search_page_size = search_page_size
+        self.playlist_size = playlist_size
+        self.playlist_page_size = playlist_page_size
+
+    def title(self, video_id: str):
+        return f"Benchmark {video_id}"
+
+    def stream_dicts(self, video_id: str):
+        def stream(itag, mime_type, size, **extra):
+            data = {
+                "url": f"{self.server_url}&id={video_id}&itag={itag}&clen={size}",
+                "itag": itag,
+                "mimeType": mime_type,
+                "is_otf": False,
+                "bitrate": 500000,
+                "contentLength": str(size),
+                "approxDurationMs": "60000",
+                "lastModified": "0",
+            }
+            data.update(extra)
+            return data
+
+        return [
+            stream(18, 'video/mp4; codecs="avc1.42001E, mp4a.40.2"', self.video_size, width=640, height=360, fps=30),
+            stream(140, 'audio/mp4; codecs="mp4a.40.2"', self.audio_size),
+        ]
+
+    @contextmanager
+    def installed(self):
+        """Swap the pytubefix classes used by the services for the fakes while the block runs."""
+        from core.services import download, manifest, search
+
+        backend = self
+
+        class YouTube(FakeYouTube):
+            def __init__(self, url: str, *args, **kwargs):
+                super().__init__(backend, url)
+
+        class Search(FakeSearch):
+            def __init__(self, query: str, *args, **kwargs):
+                super().__init__(backend, query, kwargs.get("filters"))
+
+        class Playlist(FakePlaylist):
+            def __init__(self, url: str, *args, **kwargs):
+                super().__init__(backend, url)
+
+        patches = [(manifest, "YouTube", YouTube), (search, "Search", Search), (download, "Playlist", Playlist)]
+        originals = [(module, name, getattr(module, name)) for module, name, _ in patches]
+        for module, name, fake in patches:
+            setattr(module, name, fake)
+        try:
+            yield self
+        finally:
+            for module, name, original in originals:
+                setattr(module, name, original)
+
+
+class FakeYouTube:
+    def __init__(self, backend: FakeBackend, url: str):
+        self.backend = backend
+        self.video_id = extract.video_id(url)
+        self.watch_url = f"https://www.youtube.com/watch?v={self.video_id}"
+        self.author = "benchmark"
+        self.views = 0
+        self.length = 60
+        self.thumbnail_url = None
+        self._vid_info = None
+
+    @property
+    def vid_info(self):
+        # Giống pytubefix: yêu cầu player chỉ gửi một lần
+        if self._vid_info is None:
+            with self.backend._lock:
+                self.backend.player_requests += 1
+            time.sleep(self.backend.resolve_latency)
+            self._vid_info = {"videoDetails": {"videoId": self.video_id}}
+        return self._vid_info
+
+    @property
+    def title(self):
+        # Giống pytubefix 9.2: tiêu đề của kết quả tìm kiếm cũng cần yêu cầu player
+        self.vid_info
+        return self.backend.title(self.video_id)
+
+    @property
+    def fmt_streams(self):
+        self.vid_info
+        monostate = Monostate(None, None, title=self.title, duration=self.length)
+        return [Stream(data, monostate, None, None) for data in self.backend.stream_dicts(self.video_id)]
+
+
+class FakeSearch:
+    def __init__(self, backend: FakeBackend, query: str, filters: dict = None):
+        self.backend = backend
+        self.query = query
+        self.filters = filters
+        self._videos = None
+        self._current_continuation = None
+
+    def _page(self, start: int):
+        time.sleep(self.backend.page_latency)
+        end = min(start + self.backend.search_page_size, self.backend.search_results)
+        self._current_continuation = end if end < self.backend.search_results else None
+        return [FakeYouTube(self.backend, f"https://www.youtube.com/watch?v=k{n:010d}") for n in range(start, end)]
+
+    @property
+    def videos(self):
+        if self._videos is None:
+            self._videos = self._page(0)
+        return self._videos
+
+    def get_next_results(self):
+        if self._current_continuation is None:
+            raise IndexError("Không còn kết quả")
+        self._videos.extend(self._page(self._current_continuation))
+
+
+class FakePlaylist:
+    def __init__(self, backend: FakeBackend, url: str):
+        self.backend = backend
+        self.playlist_url = url
+        self.title = "Benchmark playlist"
+        self.owner = "benchmark"
+
+    def url_generator(self):
+        for start in range(0, self.backend.playlist_size, self.backend.playlist_page_size):
+            time.sleep(self.backend.page_latency)
+            end = min(start + self.backend.playlist_page_size, self.backend.playlist_size)
+            for n in range(start, end):
+                yield f"https://www.youtube.com/watch?v=p{n:010d}"
+
+    def __len__(self):
+        return self.backend.playlist_size
@@ -0,0 +1,154 @@
+import os
+import re
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+BLOCK_SIZE = 64 * 1024
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _query(self):
+        return parse_qs(urlparse(self.path).query)
+
+    def _size(self):
+        """A `clen` query parameter selects a synthetic stream of that size, as on YouTube."""
+        clen = self._query().get("clen")
+        return int(clen[0]) if clen else len(self.server.payload)
+
+    def _read(self, start: int, end: int):
+        if not self._query().get("clen"):
+            return self.server.payload[start:end]
+        # Nội dung tổng hợp: lặp lại một khối ngẫu nhiên cố định
+        pattern = self.server.pattern
+        offset = start % len(pattern)
+        data = pattern[offset:offset + end - start]
+        while len(data) < end - start:
+            data += pattern[:end - start - len(data)]
+        return data
+
+    def _requested_range(self, size: int):
+        """Accept both a `Range` header and pytubefix's `&range=start-end` query."""
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not match:
+            query = self._query().get("range")
+            match = re.match(r"(\d+)-(\d*)", query[0]) if query else None
+        if not match:
+            return None
+        start = int(match.group(1))
+        end = int(match.group(2)) + 1 if match.group(2) else size
+        return start, min(end, size)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(self._size()))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        size = self._size()
+        requested = self._requested_range(size)
+        start, end = requested or (0, size)
+        failure = self.server.roll_failure()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if failure == "error":
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(206 if requested and self.headers.get("Range") else 200)
+        self.send_header("Content-Length", str(end - start))
+        self.send_header("Accept-Ranges", "bytes")
+        if requested:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self.end_headers()
+
+        # Lỗi "reset": gửi một nửa dữ liệu rồi đóng kết nối
+        stop = start + (end - start) // 2 if failure == "reset" else end
+        bandwidth = self.server.bandwidth
+        try:
+            for offset in range(start, stop, BLOCK_SIZE):
+                block = self._read(offset, min(offset + BLOCK_SIZE, stop))
+                self.wfile.write(block)
+                if bandwidth:
+                    # Giới hạn băng thông cho từng kết nối, giống YouTube
+                    time.sleep(len(block) / bandwidth)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        if failure == "reset":
+            self.close_connection = True
+
+
+class _StreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def roll_failure(self):
+        """Decide, reproducibly for a given seed, whether this request fails and how."""
+        with self.stats_lock:
+            self.requests += 1
+            if not self.failure_rate or self.rng.random() >= self.failure_rate:
+                return None
+            self.failures += 1
+            return self.rng.choice(("error", "reset"))
+
+
+class LocalStreamServer:
+    """
+    Range-capable HTTP server that serves one fixed payload from memory, or
+    a synthetic stream of `clen` bytes when the URL carries that parameter.
+
+    `bandwidth` caps each connection in bytes per second and `latency` delays
+    every response, to mimic YouTube's per-connection throttling.
+    `failure_rate` makes that fraction of requests fail, either with HTTP 503
+    or by dropping the connection halfway; `seed` makes the failures
+    reproducible.
+    """
+
+    def __init__(self, size: int, bandwidth: float = None, latency: float = 0.0,
+                 failure_rate: float = 0.0, seed: int = 0):
+        self.payload = os.urandom(size)
+        self.httpd = _StreamServer(("127.0.0.1", 0), _StreamHandler)
+        self.httpd.payload = self.payload
+        self.httpd.pattern = random.Random(seed).randbytes(1024 * 1024)
+        self.httpd.bandwidth = bandwidth
+        self.httpd.latency = latency
+        self.httpd.failure_rate = failure_rate
+        self.httpd.rng = random.Random(seed)
+        self.httpd.stats_lock = threading.Lock()
+        self.httpd.requests = 0
+        self.httpd.failures = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        # `expire` giúp Stream.expiration phân tích được URL như URL thật
+        return f"http://127.0.0.1:{self.httpd.server_port}/videoplayback?expire={int(time.time()) + 6 * 3600}"
+
+    @property
+    def stats(self):
+        return {"requests": self.httpd.requests, "failures": self.httpd.failures}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
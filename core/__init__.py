@@ -1,8 +1,14 @@
-from .header import Header
-from .utils.config import Configure
-from .screens.settings import SettingScreen
-from .services.download import DownloadService
-from .misc.convert import convert_seconds, convert_filesize
+import importlib
+
+# Nạp khi dùng đến, để `import core` không kéo theo pytubefix/tqdm
+_EXPORTS = {
+    "Header": ".header",
+    "Configure": ".utils.config",
+    "SettingScreen": ".screens.settings",
+    "DownloadService": ".services.download",
+    "convert_seconds": ".misc.convert",
+    "convert_filesize": ".misc.convert",
+}
 
 __all__ = [
     "Header",
@@ -11,4 +17,16 @@ __all__ = [
     "DownloadService",
     "convert_seconds",
     "convert_filesize"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,7 @@
+def classify_target(value: str):
+    """Tell a video URL, a playlist URL and a search keyword apart."""
+    if value.startswith(("http://", "https://", "www.", "youtube.com", "youtu.be")):
+        if "list=" in value and "watch?v=" not in value:
+            return "playlist", value
+        return "url", value
+    return "keyword", value
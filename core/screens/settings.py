@@ -4,23 +4,24 @@ from ..utils.config import Configure
 class SettingScreen():
     def __init__(self):
         self.header = Header()
-        self.configure = Configure()
+        self.configure = Configure.shared()
 
     def initialize(self):
         while True:
             self.header._print_header("Cấu hình công cụ")
             print("[1] Configure Folders")
             print("[2] Configure Threading")
+            print("[3] Configure Thumbnails")
 
             choice = input("Enter your choice ('q' to back): ").strip()
             if choice == "1":
-                Configure().configure_folders()
+                self.configure.configure_folders()
             elif choice == "2":
-                Configure().configure_threading()
+                self.configure.configure_threading()
+            elif choice == "3":
+                self.configure.configure_thumbnails()
             elif choice == "q":
                 break
             else:
                 print("❌ Lựa chọn không hợp lệ. Vui lòng thử lại.")
                 input("\nNhấn Enter để tiếp tục...")
-
-
@@ -0,0 +1,99 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+from pytubefix.itags import get_format_profile
+
+from ..utils.config import Configure
+
+
+def file_checksum(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _matches_quality(itag: int, type_download: str, quality: str = None):
+    """Check an archived itag against a requested quality without any network call."""
+    if quality in (None, "", "highest"):
+        return True
+    profile = get_format_profile(itag)
+    return profile["resolution" if type_download == "video" else "abr"] == quality
+
+
+class DownloadArchive:
+    """
+    Persistent index of finished downloads keyed by (video ID, type, itag).
+
+    Stored in SQLite under `project_root`; lookups go through the primary
+    key, so they stay fast with hundreds of thousands of entries.
+    """
+
+    def __init__(self, configure: Configure):
+        self.path = os.path.join(configure.project_root, "archive.sqlite3")
+        os.makedirs(configure.project_root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                " video_id TEXT NOT NULL,"
+                " type TEXT NOT NULL,"
+                " itag INTEGER NOT NULL,"
+                " path TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " checksum TEXT,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (video_id, type, itag)"
+                ") WITHOUT ROWID"
+            )
+
+    def find(self, video_id: str, type_download: str, quality: str = None):
+        """
+        Return the archived entry for a video as a dict, or None.
+
+        Entries whose file was moved, deleted or truncated are ignored.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT itag, path, size, checksum FROM downloads WHERE video_id = ? AND type = ?",
+                (video_id, type_download)
+            ).fetchall()
+        for itag, path, size, checksum in rows:
+            if not _matches_quality(itag, type_download, quality):
+                continue
+            try:
+                if os.path.getsize(path) != size:
+                    continue
+            except OSError:
+                continue
+            return {"video_id": video_id, "type": type_download, "itag": itag,
+                    "path": path, "size": size, "checksum": checksum}
+        return None
+
+    def entries(self, video_id: str):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT type, itag, path, size FROM downloads WHERE video_id = ?", (video_id,)
+            ).fetchall()
+        return [{"type": t, "itag": itag, "path": path, "size": size} for t, itag, path, size in rows]
+
+    def add(self, video_id: str, type_download: str, itag: int, path: str, size: int, checksum: str = None):
+        if checksum is None:
+            checksum = file_checksum(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads (video_id, type, itag, path, size, checksum, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (video_id, type_download, int(itag), os.path.abspath(path), int(size), checksum, time.time())
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
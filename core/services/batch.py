@@ -0,0 +1,199 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError, Future, FIRST_COMPLETED, wait
+
+
+class BatchResult:
+    """Outcome of a single item processed by :class:`BatchScheduler`."""
+
+    def __init__(self, index: int, item, value=None, error: Exception = None, elapsed: float = 0.0):
+        self.index = index
+        self.item = item
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class WorkerBudget:
+    """
+    Limit on items in one stage (downloading, resolving) at once across every
+    batch of a process.
+
+    `BatchScheduler` bounds one batch; the budget bounds all of them together,
+    e.g. several batches submitted to the daemon. The limit can change while
+    batches run: lowering it lets running items finish and holds new ones back.
+    """
+
+    def __init__(self, limit: int):
+        self._condition = threading.Condition()
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self._peak = 0
+
+    def take_peak(self):
+        """Most slots in use at once since the previous call."""
+        with self._condition:
+            peak, self._peak = self._peak, self.active
+            return peak
+
+    def set_limit(self, limit: int):
+        with self._condition:
+            self.limit = max(1, int(limit))
+            self._condition.notify_all()
+
+    def acquire(self):
+        """Wait for a free slot and take it; `release` gives it back, from any thread."""
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+            self._peak = max(self._peak, self.active)
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class BatchScheduler:
+    """
+    Run a batch of items on a bounded worker pool.
+
+    When `run` is interrupted (Ctrl+C), `cancelled` is set: items not started
+    yet are dropped, and workers that are running are expected to check it
+    and stop, since Python cannot interrupt their threads. `run` waits for
+    them before re-raising, so nothing keeps writing once it returns; a
+    second Ctrl+C stops the wait.
+
+    Another thread may cancel the batch by setting `cancelled` (passing its
+    own event lets it do so before `run` starts): no further item is taken
+    from `items`, and `run` returns once the running ones stopped.
+
+    A worker may also hand its item off by returning a
+    `concurrent.futures.Future` (e.g. a coroutine scheduled on the transfer
+    engine): its thread is free at once, and the item's result is whatever
+    the future resolves to. Handed-off items do not count towards
+    `max_workers`; the worker bounds them itself.
+    """
+
+    def __init__(self, max_workers: int, cancelled: threading.Event = None):
+        self.max_workers = max(1, int(max_workers))
+        self.cancelled = cancelled or threading.Event()
+
+    def _call(self, worker, index: int, item, value):
+        if self.cancelled.is_set():
+            return BatchResult(index, item, error=CancelledError())
+        start_time = time.time()
+        try:
+            value = worker(value)
+            return BatchResult(index, item, value=value, elapsed=time.time() - start_time)
+        except Exception as e:
+            return BatchResult(index, item, error=e, elapsed=time.time() - start_time)
+
+    def run(self, items, worker, on_result=None, prepare=None, prepare_workers: int = None, collect: bool = True):
+        """
+        Call `worker(item)` for every item with at most `max_workers` running at once.
+
+        If `prepare` is given, every item first goes through `prepare(item)` on a
+        separate pool of `prepare_workers` threads, and `worker` receives its
+        return value. An item is handed to `worker` as soon as it is prepared,
+        so downloads start while later items are still being resolved.
+
+        `items` is consumed lazily, so only a bounded number of items is queued
+        at any time. Errors raised by `prepare` or `worker` are captured per
+        item instead of aborting the batch. Returns the results in input order,
+        or None when `collect` is False, in which case memory use stays constant
+        however many items there are and results only reach `on_result`.
+        """
+        results = []
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        prepare_workers = max(1, int(prepare_workers or self.max_workers))
+        prepare_executor = ThreadPoolExecutor(max_workers=prepare_workers) if prepare else None
+        preparing = {}
+        working = set()
+        # Future của các mục đã giao cho nơi khác -> (index, item, thời điểm bắt đầu)
+        handed_off = {}
+        iterator = enumerate(items)
+        exhausted = False
+
+        def finish(result):
+            if collect:
+                results.append(result)
+            if on_result:
+                on_result(result)
+
+        try:
+            while preparing or working or handed_off or not exhausted:
+                while (not exhausted
+                       and not self.cancelled.is_set()
+                       and len(working) < self.max_workers * 2
+                       and (not prepare or len(preparing) < prepare_workers)):
+                    try:
+                        index, item = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    if prepare:
+                        future = prepare_executor.submit(self._call, prepare, index, item, item)
+                        preparing[future] = (index, item)
+                    else:
+                        working.add(executor.submit(self._call, worker, index, item, item))
+
+                if not preparing and not working and not handed_off:
+                    break
+
+                done, _ = wait(set(preparing) | working | set(handed_off), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in handed_off:
+                        index, item, start_time = handed_off.pop(future)
+                        try:
+                            result = BatchResult(index, item, value=future.result(),
+                                                 elapsed=time.time() - start_time)
+                        except Exception as e:
+                            result = BatchResult(index, item, error=e, elapsed=time.time() - start_time)
+                        finish(result)
+                        continue
+                    result = future.result()
+                    if future in preparing:
+                        index, item = preparing.pop(future)
+                        if result.ok:
+                            working.add(executor.submit(self._call, worker, index, item, result.value))
+                        else:
+                            finish(result)
+                    else:
+                        working.discard(future)
+                        if result.ok and isinstance(result.value, Future):
+                            handed_off[result.value] = (result.index, result.item, time.time() - result.elapsed)
+                        else:
+                            finish(result)
+        except BaseException:
+            # Ctrl+C: bỏ các mục chưa chạy, báo các luồng đang tải dừng ở khối kế tiếp và chờ chúng dừng hẳn
+            self.cancelled.set()
+            if prepare_executor:
+                prepare_executor.shutdown(wait=False, cancel_futures=True)
+            executor.shutdown(wait=True, cancel_futures=True)
+            # Các mục đã giao đi cũng thấy `cancelled` ở khối kế tiếp, kể cả mục vừa giao chưa kịp ghi nhận
+            for future in working:
+                if future.done() and not future.cancelled() and isinstance(future.result().value, Future):
+                    handed_off[future.result().value] = None
+            wait(handed_off)
+            raise
+        if prepare_executor:
+            prepare_executor.shutdown(wait=True)
+        executor.shutdown(wait=True)
+
+        if not collect:
+            return None
+        results.sort(key=lambda result: result.index)
+        return results
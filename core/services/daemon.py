@@ -0,0 +1,391 @@
+import sys
+import json
+import time
+import queue
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from .download import DownloadService
+from .jobs import PENDING, RESOLVING, DOWNLOADING
+from ..misc.targets import classify_target
+
+# Khoảng cách tối thiểu giữa hai sự kiện progress của cùng một lô
+PROGRESS_INTERVAL = 0.5
+# Gửi dòng chú thích định kỳ để proxy/trình duyệt không đóng kết nối SSE
+KEEPALIVE_INTERVAL = 15
+TARGET_KINDS = ("url", "playlist", "keyword")
+
+
+class EventHub:
+    """
+    Fan-out of daemon events to the connected SSE clients.
+
+    Each client has a bounded queue; a client that stops reading loses
+    events instead of slowing the downloads down.
+    """
+
+    def __init__(self, backlog: int = 1000):
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._clients = set()
+        self._next_id = 0
+
+    def subscribe(self):
+        client = queue.Queue(maxsize=self.backlog)
+        with self._lock:
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def publish(self, event: str, data: dict):
+        with self._lock:
+            self._next_id += 1
+            message = (self._next_id, event, data)
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def close(self):
+        """End every client's stream."""
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(None)
+            except queue.Full:
+                pass
+
+
+def parse_submission(body: dict):
+    """
+    Turn a submission body into `(targets, type, quality, keyword_limit)`.
+
+    `targets` holds URLs, playlist URLs or keywords (told apart like on the
+    command line) or explicit `[kind, value]` pairs; `playlists` and
+    `keywords` are lists of plain values.
+    """
+    if not isinstance(body, dict):
+        raise ValueError("body must be a JSON object")
+    targets = []
+    for target in body.get("targets") or []:
+        if isinstance(target, str):
+            targets.append(classify_target(target.strip()))
+        elif isinstance(target, (list, tuple)) and len(target) == 2 and target[0] in TARGET_KINDS:
+            targets.append((target[0], str(target[1])))
+        else:
+            raise ValueError(f"invalid target: {target!r}")
+    targets += [("playlist", str(value)) for value in body.get("playlists") or []]
+    targets += [("keyword", str(value)) for value in body.get("keywords") or []]
+    if not targets:
+        raise ValueError("no targets given")
+    type_download = body.get("type", "video")
+    if type_download not in ("video", "audio"):
+        raise ValueError("type must be 'video' or 'audio'")
+    limit = body.get("limit")
+    if limit is not None and (not isinstance(limit, int) or limit < 1):
+        raise ValueError("limit must be a positive integer")
+    return targets, type_download, body.get("quality") or None, limit
+
+
+class DownloadDaemon:
+    """
+    Long-running download service behind a local HTTP API.
+
+    One `DownloadService` (transfer engine, connection pool, manifest and
+    search caches, governor) serves every submitted batch, so clients share
+    warm caches and one rate limit. At most `max_batches` batches run side
+    by side (the rest wait, "queued"), and their items resolve and download
+    within the service's shared budgets: `preflight_workers` resolves and
+    `max_workers` transfers in total, however many batches are running.
+
+    Batches live in the persistent job queue, so a batch interrupted by a
+    restart is picked up again when the daemon starts. `stop` cancels the
+    running batches and gives up their leases, so another process can take
+    them over at once.
+
+        POST /jobs        submit {"targets": [...], "type", "quality", "limit"}
+        GET  /jobs        recent batches
+        GET  /jobs/<id>   one batch with its items and progress
+        GET  /events      progress and state changes as server-sent events
+                          (`?job=<id>` for one batch)
+        GET  /health      liveness and the worker budget
+
+    The API has no authentication; it binds to 127.0.0.1 by default.
+    """
+
+    def __init__(self, service: DownloadService = None, host: str = None, port: int = None,
+                 thumbnails: bool = None):
+        self.service = service or DownloadService()
+        # None: theo configure.download_thumbnails
+        self.thumbnails = thumbnails
+        options = self.service.configure.daemon
+        self.host = host or options['host']
+        self.port = options['port'] if port is None else port
+        self.max_batches = max(1, int(options.get('max_batches', 2)))
+        self.events = EventHub()
+        self.httpd = None
+        self._lock = threading.Lock()
+        # Lô đã nhận (đang chờ hoặc đang chạy) -> trạng thái trong bộ nhớ
+        self._running = {}
+        self._summaries = {}
+        self._queue = queue.Queue()
+        self._runners = []
+        self.stopping = threading.Event()
+        self.service.jobs.subscribe(self._on_job_state)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2] if self.httpd else (self.host, self.port)
+        return f"http://{host}:{port}"
+
+    def _on_job_state(self, batch_id: int, url: str, state: str, error: str, path: str):
+        self.events.publish("item", {"id": batch_id, "url": url, "state": state, "error": error, "path": path})
+
+    def submit(self, targets, type_download: str = "video", quality: str = None, keyword_limit: int = None):
+        """Record a batch in the job queue and start it; returns its ID."""
+        batch_id = self.service.jobs.create_batch("daemon", type_download, quality, targets, keyword_limit)
+        self._start(self.service.jobs.batch(batch_id))
+        return batch_id
+
+    def _start(self, job_batch: dict):
+        with self._lock:
+            self._running[job_batch["id"]] = {"started_at": None, "progress": None, "cancelled": threading.Event()}
+            # Số luồng chạy lô cố định, không tăng theo số lô được gửi
+            while len(self._runners) < self.max_batches:
+                runner = threading.Thread(target=self._runner, name=f"batch-runner-{len(self._runners)}", daemon=True)
+                runner.start()
+                self._runners.append(runner)
+        self.events.publish("batch", {"id": job_batch["id"], "state": "queued"})
+        self._queue.put(job_batch)
+
+    def _runner(self):
+        while True:
+            job_batch = self._queue.get()
+            if job_batch is None:
+                return
+            if self.stopping.is_set():
+                # Lô chưa kịp chạy: nhả lease cho lần chạy sau
+                self.service.jobs.release(job_batch["id"])
+                with self._lock:
+                    del self._running[job_batch["id"]]
+                continue
+            self._run(job_batch)
+
+    def _run(self, job_batch: dict):
+        batch_id = job_batch["id"]
+        last_event = [0.0]
+        with self._lock:
+            self._running[batch_id]["started_at"] = time.time()
+            cancelled = self._running[batch_id]["cancelled"]
+        self.events.publish("batch", {"id": batch_id, "state": "running"})
+
+        def on_progress(snapshot):
+            with self._lock:
+                self._running[batch_id]["progress"] = snapshot
+            now = time.monotonic()
+            if now - last_event[0] >= PROGRESS_INTERVAL:
+                last_event[0] = now
+                self.events.publish("progress", dict(snapshot, id=batch_id))
+
+        try:
+            summary = self.service.download_targets(
+                job_batch["targets"] or [], job_batch["type"], job_batch["quality"], job_batch["keyword_limit"],
+                show_progress=False, job_batch=job_batch, on_progress=on_progress, thumbnails=self.thumbnails,
+                cancelled=cancelled
+            )
+            state = "interrupted" if cancelled.is_set() else "finished"
+        except Exception as e:
+            summary = {"error": str(e)}
+            state = "failed"
+            print(f"❌ Lô #{batch_id} lỗi: {str(e)}", file=sys.stderr)
+        with self._lock:
+            del self._running[batch_id]
+            self._summaries[batch_id] = summary
+            # Chỉ giữ tóm tắt của các lô gần nhất trong bộ nhớ
+            for old_id in sorted(self._summaries)[:-100]:
+                del self._summaries[old_id]
+        self.events.publish("batch", {
+            "id": batch_id, "state": state,
+            **{key: summary.get(key) for key in ("total", "succeeded", "skipped", "failed", "cancelled", "error")
+               if key in summary},
+        })
+
+    def _state(self, job_batch: dict):
+        with self._lock:
+            running = self._running.get(job_batch["id"])
+            if running is not None:
+                return "running" if running["started_at"] else "queued"
+        if job_batch["finished_at"] is not None:
+            return "finished"
+        if self.service.jobs.leased(job_batch):
+            # Đang chạy ở một tiến trình khác dùng chung hàng đợi
+            return "running"
+        counts = job_batch["counts"]
+        # Chưa xong nhưng không chạy: lô của một lần chạy trước, sẽ được tiếp tục khi khởi động lại
+        if not job_batch["expanded"] or any(counts.get(state) for state in (PENDING, RESOLVING, DOWNLOADING)):
+            return "interrupted"
+        return "finished"
+
+    def batch_status(self, batch_id: int, items: bool = True):
+        """A batch from the job queue with its state, live progress and (when finished here) summary."""
+        job_batch = self.service.jobs.batch(batch_id)
+        if job_batch is None:
+            return None
+        status = dict(job_batch, state=self._state(job_batch))
+        with self._lock:
+            running = self._running.get(batch_id)
+            summary = self._summaries.get(batch_id)
+            status["progress"] = running["progress"] if running else None
+        if summary is not None:
+            status["summary"] = summary
+        if items:
+            status["items"] = self.service.jobs.items(batch_id)
+        return status
+
+    def health(self):
+        budget = self.service.budget
+        with self._lock:
+            running = sorted(batch_id for batch_id, state in self._running.items() if state["started_at"])
+            queued = sorted(batch_id for batch_id, state in self._running.items() if not state["started_at"])
+        return {"ok": True, "running": running, "queued": queued, "max_batches": self.max_batches,
+                "max_workers": budget.limit, "active_workers": budget.active,
+                "max_resolves": self.service.resolve_budget.limit,
+                "active_resolves": self.service.resolve_budget.active}
+
+    def start(self):
+        """Bind the API and resume the batches an earlier run left unfinished."""
+        self.httpd = _DaemonServer((self.host, self.port), _DaemonHandler, self)
+        for job_batch in self.service.jobs.unfinished():
+            job_batch = self.service.jobs.claim(job_batch["id"])
+            if job_batch is None:
+                continue
+            print(f"♻️ Tiếp tục lô #{job_batch['id']} ({job_batch['type']})", file=sys.stderr)
+            self._start(job_batch)
+        return self
+
+    def serve_forever(self):
+        if self.httpd is None:
+            self.start()
+        self.httpd.serve_forever()
+
+    def stop(self):
+        """
+        Stop serving, cancel the running batches and wait for them to stop.
+        Their unfinished jobs stay pending and their leases are released, so
+        they resume on the next start (of this or any other process).
+        """
+        self.stopping.set()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        with self._lock:
+            for running in self._running.values():
+                running["cancelled"].set()
+            runners = list(self._runners)
+        for _ in runners:
+            self._queue.put(None)
+        for runner in runners:
+            runner.join()
+        self.events.close()
+
+
+class _DaemonServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler, owner: DownloadDaemon):
+        self.owner = owner
+        super().__init__(address, handler)
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    server_version = "YoutubeDownloaderDaemon"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def daemon(self) -> DownloadDaemon:
+        return self.server.owner
+
+    def _send_json(self, status: int, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _path(self):
+        parsed = urlparse(self.path)
+        return [part for part in parsed.path.split("/") if part], parse_qs(parsed.query)
+
+    def do_GET(self):
+        parts, query = self._path()
+        if parts == ["health"]:
+            self._send_json(200, self.daemon.health())
+        elif parts == ["jobs"]:
+            limit = query.get("limit", ["50"])[0]
+            limit = int(limit) if limit.isdigit() else 50
+            batches = [self.daemon.batch_status(job_batch["id"], items=False)
+                       for job_batch in self.daemon.service.jobs.batches(limit)]
+            self._send_json(200, {"jobs": batches})
+        elif len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            status = self.daemon.batch_status(int(parts[1]))
+            if status is None:
+                self._send_json(404, {"error": "job not found"})
+            else:
+                self._send_json(200, status)
+        elif parts == ["events"]:
+            job = query.get("job", [None])[0]
+            self._stream_events(int(job) if job and job.isdigit() else None)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts, _ = self._path()
+        if parts != ["jobs"]:
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            targets, type_download, quality, limit = parse_submission(body)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        batch_id = self.daemon.submit(targets, type_download, quality, limit)
+        self._send_json(202, {"id": batch_id, "url": f"/jobs/{batch_id}"})
+
+    def _stream_events(self, job: int = None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        client = self.daemon.events.subscribe()
+        try:
+            while not self.daemon.stopping.is_set():
+                try:
+                    message = client.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+                    continue
+                if message is None:
+                    break
+                event_id, event, data = message
+                if job is not None and data.get("id") != job:
+                    continue
+                payload = json.dumps(data, ensure_ascii=False)
+                self.wfile.write(f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.daemon.events.unsubscribe(client)
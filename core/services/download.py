@@ -1,41 +1,704 @@
+import os
+import sys
 import time
+import asyncio
+import threading
+from concurrent.futures import CancelledError
 
-from tqdm import tqdm
-from pytubefix import YouTube, Search, streams
+from pytubefix import Playlist, streams
 from pytubefix.cli import on_progress
 from pytubefix.exceptions import VideoUnavailable, VideoPrivate, VideoRegionBlocked, LoginRequired
 
+from .batch import BatchScheduler, WorkerBudget
+from pytubefix import extract
+
+from .archive import DownloadArchive
+from .manifest import ManifestCache
+from .engine import AsyncTransferEngine, TransferTask
+from .governor import Governor
+from .jobs import JobQueue, PENDING, RESOLVING, DOWNLOADING, DONE, FAILED
+from .media import MediaPipeline
+from .metrics import MetricsRecorder, ItemMetrics, BatchMetrics
+from .progress import ProgressRenderer, ProgressTask
+from .search import SearchCache
+from .thumbnail import ThumbnailFetcher
+from .transfer import TransferCancelled
+from .tuner import ConcurrencyTuner
 from ..header import Header
 from ..utils.config import Configure
 from ..misc.convert import convert_seconds, convert_filesize
 
+# Luồng chọn stream rồi giao mục cho vòng lặp của engine; việc tải không giữ luồng nào
+HANDOFF_WORKERS = 2
+
 class DownloadService:
     def __init__(self):
         self.header = Header()
-        self.configure = Configure()
+        self.configure = Configure.shared()
+
+        self.governor = Governor(self.configure)
+        self.manifests = ManifestCache(self.configure)
+        self.searches = SearchCache(self.configure, governor=self.governor)
+        self.archive = DownloadArchive(self.configure)
+        self.jobs = JobQueue(self.configure)
+        # Mọi lần tải dùng chung một vòng lặp asyncio và một pool kết nối
+        self.engine = AsyncTransferEngine(governor=self.governor)
+        self.thumbnails = ThumbnailFetcher(self.configure, engine=self.engine)
+        self.media = MediaPipeline(self.configure)
+        self.metrics = MetricsRecorder(self.configure)
+        # Số mục được tải cùng lúc trên mọi lô của tiến trình, do tuner điều chỉnh nếu được bật
+        self.budget = WorkerBudget(self.configure.max_workers)
+        self.tuner = ConcurrencyTuner(self.configure, self.budget)
+        self.budget.set_limit(self._worker_limit())
+        # Số mục được phân giải cùng lúc trên mọi lô, để nhiều lô không nhân số yêu cầu lên YouTube
+        self.resolve_budget = WorkerBudget(self.configure.preflight_workers)
+        self.configure.subscribe(self._on_config_changed)
+
+    # Đọc thư mục từ cấu hình mỗi lần dùng để thay đổi trong Settings có hiệu lực ngay
+    @property
+    def video_folder(self):
+        return self.configure.video_folder
+
+    @property
+    def audio_folder(self):
+        return self.configure.audio_folder
+
+    def _on_config_changed(self, configure: Configure, changed: set):
+        if "governor" in changed:
+            self.governor.apply(configure)
+        if changed & {"max_workers", "auto_tune"}:
+            self.budget.set_limit(self._worker_limit())
+        if "preflight_workers" in changed:
+            self.resolve_budget.set_limit(configure.preflight_workers)
+
+    def _worker_limit(self):
+        """Starting number of concurrent items: tuned when auto-tuning is on, else `max_workers`."""
+        return self.tuner.initial_limit() if self.tuner.enabled else self.configure.max_workers
+
+    def _worker_ceiling(self):
+        """Most items the budget may let download at once, i.e. the progress bars a batch may need."""
+        return self.tuner.bounds()[1] if self.tuner.enabled else self.configure.max_workers
+
+    def _segment_connections(self):
+        return min(self.configure.segmented_download['connections'], self.configure.max_workers)
+
+    def _select_stream(self, query, type_download: str, quality: str = None):
+        """
+        Pick the stream to download: the best one by default, or the given
+        resolution (e.g. "720p") / audio bitrate (e.g. "128kbps").
+        """
+        if quality in (None, "", "highest"):
+            ds = query.get_highest_resolution() if type_download == "video" else query.get_audio_only()
+        elif type_download == "video":
+            ds = query.get_by_resolution(quality)
+        else:
+            ds = query.filter(only_audio=True, abr=quality).first()
+        if ds is None:
+            raise ValueError(f"Không tìm thấy luồng {type_download} phù hợp (chất lượng: {quality or 'highest'})")
+        output_path = self.video_folder if type_download == "video" else self.audio_folder
+        return ds, output_path
+
+    def _post_process(self, type_download: str):
+        """The ffmpeg step for `type_download` ("mux" or "transcode"), or None."""
+        if not self.media.available:
+            return None
+        options = self.configure.media_pipeline
+        if type_download == "video" and options['adaptive_video']:
+            return "mux"
+        if type_download == "audio" and options['transcode_audio']:
+            return "transcode"
+        return None
+
+    def _needs_post_process(self, type_download: str, selected):
+        """Whether the selected streams go through ffmpeg (a progressive fallback does not)."""
+        step = self._post_process(type_download)
+        return step == "transcode" or (step == "mux" and len(selected) > 1)
+
+    def _select_streams(self, query, type_download: str, quality: str = None):
+        """
+        Pick the streams of one item: the best adaptive video and audio
+        streams when they can be muxed, otherwise the single stream chosen by
+        `_select_stream`.
+        """
+        if self._post_process(type_download) == "mux":
+            videos = query.filter(adaptive=True, only_video=True)
+            if quality not in (None, "", "highest"):
+                videos = videos.filter(res=quality)
+            candidates = list(videos.order_by("resolution").desc())
+            audio = query.get_audio_only() or query.filter(only_audio=True).order_by("abr").last()
+            if candidates and audio is not None:
+                best = [s for s in candidates if s.resolution == candidates[0].resolution]
+                # Ưu tiên mp4 để ghép vào .mp4 mà không phải mã hoá lại
+                best.sort(key=lambda s: (s.subtype == "mp4", s.bitrate or 0), reverse=True)
+                return [best[0], audio], self.video_folder
+        ds, output_path = self._select_stream(query, type_download, quality)
+        return [ds], output_path
+
+    def _transfer_task(self, ds: streams.Stream, output_path: str, filename: str = None, on_bytes=None,
+                       cancelled=None):
+        """
+        Engine task for `ds`, stopped when the `cancelled` event is set. Large
+        streams use several connections when `segmented_download` is enabled
+        in the configuration.
+        """
+        file_path = ds.get_file_path(filename=filename, output_path=output_path)
+        segmented = self.configure.segmented_download
+        use_segments = segmented['enabled'] and ds.filesize >= segmented['min_size']
+        connections = self._segment_connections() if use_segments else 1
+        return TransferTask(ds.url, file_path, ds.filesize, on_progress=on_bytes, connections=connections,
+                            cancelled=cancelled)
+
+    async def _transfer_async(self, ds: streams.Stream, output_path: str, filename: str = None, on_bytes=None,
+                              cancelled=None):
+        """
+        Download `ds` on the asyncio transfer engine's loop.
+
+        SABR and OTF streams cannot be fetched by byte range, so they fall back
+        to pytubefix in a worker thread, which reports progress through the
+        stream's callback.
+        """
+        if ds.is_sabr or ds.is_otf:
+            return await asyncio.to_thread(ds.download, output_path=output_path, filename=filename)
+        return await self.engine.transfer(self._transfer_task(ds, output_path, filename, on_bytes, cancelled))
+
+    def _transfer(self, ds: streams.Stream, output_path: str, filename: str = None, on_bytes=None,
+                  cancelled=None):
+        """`_transfer_async`, waiting for the result in the calling thread."""
+        return self.engine.call(self._transfer_async(ds, output_path, filename, on_bytes, cancelled))
+
+    def _file_stem(self, title: str, video_id: str):
+        # Hai video trùng tiêu đề không được dùng chung tệp
+        return f"{title} [{video_id}]"
+
+    def _file_name(self, title: str, video_id: str, type_download: str):
+        stem = self._file_stem(title, video_id)
+        return stem+".mp4" if type_download == "video" else stem+".mp3"
+
+    async def _transfer_parts_async(self, selected, output_path: str, stem: str, on_bytes=None, cancelled=None):
+        """
+        Download the streams to be post-processed side by side, each under an
+        intermediate `<stem>.f<itag>.<ext>` name (see `_file_stem`). Returns
+        their paths.
+        """
+        paths = await asyncio.gather(*(
+            self._transfer_async(ds, output_path, f"{stem}.f{ds.itag}.{ds.subtype}", on_bytes, cancelled)
+            for ds in selected
+        ), return_exceptions=True)
+        errors = [path for path in paths if isinstance(path, BaseException)]
+        if errors:
+            raise errors[0]
+        return paths
+
+    def _transfer_parts(self, selected, output_path: str, stem: str, on_bytes=None, cancelled=None):
+        """`_transfer_parts_async`, waiting for the result in the calling thread."""
+        return self.engine.call(self._transfer_parts_async(selected, output_path, stem, on_bytes, cancelled))
+
+    def _governed_hooks(self, label: str, progress: ProgressTask = None, item: ItemMetrics = None):
+        """
+        The `on_bytes` and `on_retry` callbacks of a governed call, plus the
+        one-element list counting the bytes reported since the last retry.
+
+        A retried transfer resumes from its `.part` file and reports the bytes
+        it already has again, so the bytes of a failed attempt are taken back
+        from `progress` and `item` first.
+        """
+        received = [0]
+        count = self.tuner.add_bytes if self.tuner.enabled else None
+
+        def on_bytes(n: int):
+            received[0] += n
+            if item:
+                item.on_bytes(n)
+            if progress:
+                progress.update(n)
+            if count:
+                count(n)
 
-        self.video_folder = self.configure.video_folder
-        self.audio_folder = self.configure.audio_folder
+        def on_retry(attempt: int, error: Exception, delay: float):
+            self.tuner.on_retry(error)
+            if progress:
+                progress.rewind(received[0])
+            if item:
+                item.bytes -= received[0]
+                item.retries += 1
+            received[0] = 0
+            message = f"🔁 Thử lại {label} ({attempt}/{self.governor.max_retries}) sau {delay:.1f}s: {error}"
+            progress.write(message) if progress else print(message, file=sys.stderr)
 
-        self.progress_bar = None
-        self.bytes_downloaded_in_current_file = 0
+        return received, on_bytes, on_retry
 
-    def _on_progress(self, stream: streams.Stream, chunk: bytes, bytes_remaining: int):
-        # Calculate bytes just downloaded in this chunk
-        current_bytes_downloaded = stream.filesize - bytes_remaining
-        newly_downloaded_bytes = current_bytes_downloaded - self.bytes_downloaded_in_current_file
+    def _governed(self, fn, label: str, progress: ProgressTask = None, item: ItemMetrics = None,
+                  on_refresh=None, acquire: bool = False, cancelled=None):
+        """
+        Run `fn(on_bytes)` under the governor, retrying transient failures
+        (see `_governed_hooks`). Returns `(result, bytes reported)`.
+        """
+        received, on_bytes, on_retry = self._governed_hooks(label, progress, item)
+        result = self.governor.call(lambda: fn(on_bytes), on_retry=on_retry, on_refresh=on_refresh, acquire=acquire,
+                                    cancelled=cancelled)
+        return result, received[0]
+
+    async def _governed_async(self, fn, label: str, progress: ProgressTask = None, item: ItemMetrics = None,
+                              on_refresh=None, cancelled=None):
+        """`_governed` for a coroutine function `fn(on_bytes)`, awaited on the engine loop."""
+        received, on_bytes, on_retry = self._governed_hooks(label, progress, item)
+        result = await self.governor.call_async(lambda: fn(on_bytes), on_retry=on_retry, on_refresh=on_refresh,
+                                                cancelled=cancelled)
+        return result, received[0]
+
+    def _submit_post_process(self, parts, file_path: str, on_done=None, group=None):
+        """Queue muxing (two parts) or audio transcoding (one part) on the media pipeline."""
+        if len(parts) > 1:
+            return self.media.mux(parts[0], parts[1], file_path, on_done=on_done, group=group)
+        return self.media.transcode_audio(parts[0], file_path, on_done=on_done, group=group)
+
+    def _resolve_item(self, option, type_download: str, progress: ProgressRenderer, quality: str = None,
+                      batch: BatchMetrics = None):
+        """
+        Resolve a batch item's manifest and add its size to the batch total.
+
+        Items already in the download archive are skipped before any network
+        call. Files that exist with the expected size but predate the archive
+        are recorded in it and skipped too. Muxed or transcoded output has no
+        expected size, so it is only skipped through its archive entry.
+        Skipped items do not count towards the total.
+
+        The item's metrics (added to `batch`) travel with the resolved tuple.
+        """
+        link, title = option
+        item = batch.new_item(link, type_download) if batch else ItemMetrics(link, type_download)
+        with self.metrics.track(item):
+            video_id = extract.video_id(link)
+            item.video_id = video_id
+            archived = self.archive.find(video_id, type_download, quality)
+            if archived:
+                item.itags = [archived["itag"]]
+                item.finish("skipped")
+                self.metrics.record(item)
+                return link, title, None, (archived["itag"],), True, item
+
+            manifest, _ = self._governed(lambda on_bytes: self.manifests.get(link), title or link,
+                                         item=item, acquire=True)
+            title = title or manifest.title
+            selected, output_path = self._select_streams(manifest.stream_query(), type_download, quality)
+            item.mark_resolved()
+            item.itags = [s.itag for s in selected]
+            ds = selected[0]
+            file_path = ds.get_file_path(filename=self._file_name(title, video_id, type_download),
+                                         output_path=output_path)
+            # Tệp sau ffmpeg không có kích thước để đối chiếu: chỉ tin vào bản ghi archive ở trên
+            skip = (not self._needs_post_process(type_download, selected)
+                    and os.path.isfile(file_path) and os.path.getsize(file_path) == ds.filesize)
+            if skip:
+                self.archive.add(video_id, type_download, ds.itag, file_path, os.path.getsize(file_path))
+                item.finish("skipped")
+                self.metrics.record(item)
+            else:
+                progress.add_total(sum(s.filesize for s in selected))
+            return link, title, manifest, tuple(s.itag for s in selected), skip, item
+
+    def _download_item(self, resolved, type_download: str, progress: ProgressRenderer, group=None,
+                       cancelled=None, thumbnails: bool = False):
+        """
+        Start downloading a resolved batch item, reporting its bytes as one task of the batch's progress.
+        Setting the `cancelled` event stops its transfer, keeping the `.part` file for resuming.
+        With `thumbnails`, the video's thumbnail is fetched alongside.
+
+        Only stream selection runs in the calling thread: the transfer is a
+        coroutine on the engine loop, so a waiting item holds no thread.
+        Streams that need ffmpeg are then handed to the media pipeline.
+        Background work is tagged with `group` so the batch waits only for its own.
+
+        Returns a `concurrent.futures.Future` of the file path, or None if the item was skipped.
+        """
+        link, title, manifest, itags, skip, item = resolved
+        if skip:
+            return None
+        current = {"manifest": manifest}
+
+        def select(on_bytes):
+            query = current["manifest"].stream_query(
+                on_progress_callback=lambda stream, chunk, bytes_remaining: on_bytes(len(chunk))
+            )
+            return [query.get_by_itag(itag) for itag in itags]
+
+        def refresh(error):
+            # URL đã ký hết hạn: phân giải lại manifest trước khi thử lại
+            self.manifests.invalidate(manifest.video_id)
+            current["manifest"] = self.manifests.get(link)
+
+        with self.metrics.track(item):
+            selected = select(lambda n: None)
+            ds = selected[0]
+            post_process = self._needs_post_process(type_download, selected)
+            if thumbnails:
+                # Chạy song song, không chặn luồng tải media
+                self.thumbnails.fetch(manifest.video_id, manifest.thumbnail_url, group=group)
+            output_path = self.video_folder if type_download == "video" else self.audio_folder
+            file_name = self._file_name(title, manifest.video_id, type_download)
+            file_path = ds.get_file_path(filename=file_name, output_path=output_path)
+
+        async def transfer(on_bytes):
+            streams_ = select(on_bytes)
+            if post_process:
+                return await self._transfer_parts_async(streams_, output_path,
+                                                        self._file_stem(title, manifest.video_id), on_bytes, cancelled)
+            return await self._transfer_async(streams_[0], output_path, file_name, on_bytes, cancelled)
+
+        def fail(error):
+            item.finish("failed", error)
+            self.metrics.record(item)
+
+        def succeed(path):
+            self._archive_item(item, manifest.video_id, type_download, ds.itag, path)
+            item.finish("succeeded")
+            self.metrics.record(item)
+
+        def on_done(path, error):
+            item.end_post_process()
+            if error is None:
+                succeed(path)
+            else:
+                fail(error)
+
+        async def download():
+            try:
+                item.start_transfer()
+                with progress.task(title, sum(s.filesize for s in selected)) as task:
+                    result, received = await self._governed_async(transfer, title, task, item, on_refresh=refresh,
+                                                                  cancelled=cancelled)
+                    # Tệp đã tồn tại sẽ bị bỏ qua mà không gọi on_progress
+                    task.update(task.total - received)
+                item.end_transfer()
+                if post_process:
+                    item.start_post_process()
+                    self._submit_post_process(result, file_path, on_done, group=group)
+                    return file_path
+                # Checksum, archive và hàng đợi job ghi đĩa: không chạy trên vòng lặp
+                await asyncio.to_thread(succeed, result)
+                return result
+            except Exception as e:
+                await asyncio.to_thread(fail, e)
+                raise
+
+        return self.engine.run(download())
+
+    def _archive_item(self, item: ItemMetrics, video_id: str, type_download: str, itag: int, file_path: str):
+        """Record a finished file in the archive, timing the checksum pass as the item's disk cost."""
+        started = time.time()
+        self.archive.add(video_id, type_download, itag, file_path, os.path.getsize(file_path))
+        item.archive_time = time.time() - started
+        item.path = file_path
+
+    def _run_batch(self, options, type_download: str, desc: str, on_result=None, collect: bool = True,
+                   quality: str = None, show_progress: bool = True, on_post_failure=None,
+                   batch: BatchMetrics = None, job_batch: int = None, on_progress=None, thumbnails: bool = None,
+                   cancelled: threading.Event = None):
+        """
+        Resolve and download `(link, title)` options on the worker pool.
+
+        `options` may be a lazy iterable; a `None` title is taken from the
+        resolved manifest. Once the transfers are done, the batch waits for the
+        media pipeline; an item whose ffmpeg step failed is marked as failed
+        in the results and reported to `on_post_failure(path, error)`.
+
+        Per-item and batch metrics are written through `self.metrics`. With
+        `job_batch`, options go through the persistent job queue, which skips
+        finished jobs and records each job's state as it changes.
+
+        Items download within `self.budget` and resolve within
+        `self.resolve_budget`, both shared by every batch running in the
+        process; with auto-tuning on, `self.tuner` moves the download limit.
+        A downloading item is a coroutine on the engine loop holding a budget
+        slot, not a thread: `HANDOFF_WORKERS` threads only select its streams.
+        `on_progress(snapshot)` receives the progress counts a few times per
+        second, even without a progress bar. `thumbnails` overrides
+        `configure.download_thumbnails` for this batch only. Setting
+        `cancelled` from another thread stops the batch like Ctrl+C, except
+        that `_run_batch` returns instead of raising.
+        """
+        # Tệp cấu hình có thể đã được sửa từ bên ngoài từ lần chạy trước
+        self.configure.reload_if_changed()
+        if thumbnails is None:
+            thumbnails = self.configure.download_thumbnails
+        batch = batch or self.metrics.batch(desc)
+        if job_batch is not None:
+            options = self.jobs.feed(job_batch, options)
+
+            def record(item):
+                # Mục bị dừng vì Ctrl+C chưa lỗi: để chờ, lần chạy sau tải tiếp từ tệp .part
+                if isinstance(item.error, TransferCancelled):
+                    self.jobs.set_state(job_batch, item.url, PENDING)
+                    return
+                self.jobs.set_state(
+                    job_batch, item.url, FAILED if item.status == "failed" else DONE,
+                    error=str(item.error) if item.error else None, path=item.path
+                )
 
-        if self.progress_bar:
-            self.progress_bar.update(newly_downloaded_bytes)
+            batch.on_finish = record
 
-        # Update the tracker for the current file's progress
-        self.bytes_downloaded_in_current_file = current_bytes_downloaded
+        def prepare(option):
+            with self.resolve_budget:
+                if job_batch is not None:
+                    self.jobs.set_state(job_batch, option[0], RESOLVING)
+                return self._resolve_item(option, type_download, progress, quality, batch)
+
+        def work(resolved):
+            if resolved[4]:
+                return None
+            # Slot được trả khi coroutine của mục kết thúc; luồng này rảnh ngay sau khi giao mục đi
+            self.budget.acquire()
+            try:
+                if job_batch is not None:
+                    self.jobs.set_state(job_batch, resolved[0], DOWNLOADING)
+                future = self._download_item(resolved, type_download, progress, group=batch,
+                                             cancelled=scheduler.cancelled, thumbnails=thumbnails)
+            except BaseException:
+                self.budget.release()
+                raise
+            future.add_done_callback(lambda _: self.budget.release())
+            return future
+
+        def finish(result):
+            if job_batch is not None and isinstance(result.error, CancelledError):
+                # Mục chưa kịp tải khi lô bị huỷ: để chờ cho lần chạy sau
+                self.jobs.set_state(job_batch, result.item[0], PENDING)
+            if on_result:
+                on_result(result, progress)
+
+        scheduler = BatchScheduler(HANDOFF_WORKERS, cancelled=cancelled)
+        try:
+            # Tổng dung lượng tăng dần khi từng mục được phân giải xong
+            with self.tuner.session(), ProgressRenderer(desc=desc, disable=not show_progress,
+                                                        max_bars=self._worker_ceiling(), on_tick=on_progress) as progress:
+                results = scheduler.run(
+                    options,
+                    work,
+                    prepare=prepare,
+                    prepare_workers=self.configure.preflight_workers,
+                    on_result=finish,
+                    collect=collect
+                )
+            self.thumbnails.wait(group=batch)
+            post_failures = self.media.wait(group=batch)
+            if post_failures:
+                errors = dict(post_failures)
+                for result in results or []:
+                    if result.ok and result.value in errors:
+                        result.error = errors[result.value]
+                        result.value = None
+                if on_post_failure:
+                    for path, error in post_failures:
+                        on_post_failure(path, error)
+            self.metrics.finish_batch(batch)
+            if job_batch is not None:
+                self.jobs.close_batch(job_batch)
+        finally:
+            # Kể cả khi bị ngắt: nhả lease để lần chạy sau tiếp tục lô ngay
+            if job_batch is not None:
+                self.jobs.release(job_batch)
+        return results
+
+    def _print_batch_summary(self, results):
+        failed = [result for result in results if not result.ok]
+        skipped = [result for result in results if result.ok and result.value is None]
+        print(f"\n✅ Thành công: {len(results) - len(failed)}/{len(results)} (bỏ qua {len(skipped)} tệp đã có)")
+        for result in failed:
+            link, title = result.item
+            print(f"❌ Lỗi khi tải {title or link}: {str(result.error)}")
+
+    def _ask_type_download(self):
+        type_download = ""
+        while type_download not in ["video", "audio"]:
+            choice = input(f"Chọn loại tải xuống (video/audio): ").lower().strip()
+            if choice in ["video", "v"]:
+                type_download = "video"
+            elif choice in ["audio", "a"]:
+                type_download = "audio"
+            else:
+                print(f"⚠️ Lựa chọn không hợp lệ. Vui lòng nhập 'video' hoặc 'audio'.")
+        return type_download
+
+    def _playlist_options(self, playlist: Playlist):
+        """Yield `(link, None)` options as playlist pages arrive."""
+        for link in playlist.url_generator():
+            yield link, None
+
+    def _expand_targets(self, targets, keyword_limit: int, errors: list):
+        """
+        Yield `(link, title)` options for `(kind, value)` targets, lazily.
+
+        A target that cannot be expanded (bad playlist, failed search) is
+        recorded in `errors` instead of stopping the batch.
+        """
+        for kind, value in targets:
+            try:
+                if kind == "playlist":
+                    yield from self._playlist_options(Playlist(value))
+                elif kind == "keyword":
+                    results, _ = self._governed(lambda on_bytes: self.searches.search(value), value, acquire=True)
+                    videos = results.ensure(keyword_limit) if keyword_limit else results.videos
+                    for result in videos:
+                        # result.title là một yêu cầu player; tiêu đề lấy từ manifest khi phân giải
+                        yield f"https://www.youtube.com/watch?v={result.video_id}", None
+                else:
+                    yield value, None
+            except Exception as e:
+                errors.append({"target": value, "error": str(e)})
+
+    def _resume_options(self, job_batch: dict, errors: list):
+        """
+        Options left to do in an unfinished job batch: its pending jobs, then
+        whatever its targets still expand to if the expansion was interrupted.
+        """
+        yield from self.jobs.pending(job_batch["id"])
+        if job_batch["targets"] and not job_batch["expanded"]:
+            yield from self._expand_targets(job_batch["targets"], job_batch["keyword_limit"], errors)
+
+    def download_targets(self, targets, type_download: str = "video", quality: str = None,
+                         keyword_limit: int = None, show_progress: bool = True, job_batch: dict = None,
+                         on_progress=None, thumbnails: bool = None, cancelled: threading.Event = None):
+        """
+        Download `(kind, value)` targets without any prompt, where kind is
+        "url", "playlist" or "keyword". Returns a JSON-serializable summary.
+
+        The batch is recorded in the job queue; passing an unfinished
+        `job_batch` returned by `self.jobs.claim(id)` runs that batch instead.
+        `on_progress`, `thumbnails` and `cancelled` are passed on to
+        `_run_batch`; items stopped by `cancelled` stay pending in the queue.
+        The summary only counts items; each item's state, error and path are
+        in the job queue under the summary's `batch_id`.
+        """
+        errors = []
+        counts = {"succeeded": 0, "skipped": 0, "failed": 0, "cancelled": 0}
+
+        def on_result(result, progress):
+            if isinstance(result.error, (CancelledError, TransferCancelled)):
+                counts["cancelled"] += 1
+            elif not result.ok:
+                counts["failed"] += 1
+            elif result.value is None:
+                counts["skipped"] += 1
+            else:
+                counts["succeeded"] += 1
+
+        def on_post_failure(path, error):
+            # Mục đã được đếm là thành công khi tải xong
+            counts["succeeded"] -= 1
+            counts["failed"] += 1
+
+        start_time = time.time()
+        batch = self.metrics.batch("targets")
+        if job_batch is None:
+            batch_id = self.jobs.create_batch("targets", type_download, quality, targets, keyword_limit)
+            options = self._expand_targets(targets, keyword_limit, errors)
+        else:
+            batch_id = job_batch["id"]
+            options = self._resume_options(job_batch, errors)
+        self._run_batch(
+            options, type_download, "Tổng",
+            on_result=on_result, collect=False, quality=quality, show_progress=show_progress,
+            on_post_failure=on_post_failure, batch=batch, job_batch=batch_id, on_progress=on_progress,
+            thumbnails=thumbnails, cancelled=cancelled
+        )
+        return {
+            "type": type_download,
+            "quality": quality or "highest",
+            "batch_id": batch_id,
+            "total": sum(counts.values()),
+            **counts,
+            "target_errors": errors,
+            "elapsed": round(time.time() - start_time, 3),
+            "metrics": batch.summary(),
+        }
+
+    def resume_jobs(self, show_progress: bool = True, thumbnails: bool = None, cancelled: threading.Event = None):
+        """
+        Finish the batches an earlier run left unfinished (Ctrl+C, crash).
+        Finished jobs are not repeated. Returns one summary per batch; once
+        `cancelled` is set, the remaining batches are left for later.
+        """
+        summaries = []
+        for job_batch in self.jobs.unfinished():
+            if cancelled is not None and cancelled.is_set():
+                break
+            job_batch = self.jobs.claim(job_batch["id"])
+            if job_batch is None:
+                # Một tiến trình khác (ví dụ daemon) đang chạy lô này
+                continue
+            done = job_batch["counts"].get(DONE, 0) + job_batch["counts"].get(FAILED, 0)
+            print(f"♻️ Tiếp tục lô #{job_batch['id']} ({job_batch['type']}): "
+                  f"đã xong {done}, còn {job_batch['counts'].get('pending', 0)} mục"
+                  f"{'' if job_batch['expanded'] else ' (và các mục chưa liệt kê)'}", file=sys.stderr)
+            summaries.append(self.download_targets(
+                job_batch["targets"] or [], job_batch["type"], job_batch["quality"],
+                job_batch["keyword_limit"], show_progress=show_progress, job_batch=job_batch,
+                thumbnails=thumbnails, cancelled=cancelled
+            ))
+        return summaries
+
+    def download_playlist(self):
+        """
+        Download every video of a playlist, streaming its pages into the worker pool.
+        """
+        while True:
+            self.configure.reload_if_changed()
+            self.header._print_header("Download playlist from URL")
+            print(f"📂 Folders:")
+            print(f"   🎵Audio: {self.configure.audio_folder}")
+            print(f"   🎥Video: {self.configure.video_folder}")
+            print("-" * 70)
+            print("[q] To back")
+            print("=" * 70)
+            try:
+                url_input = input(">>> Nhập URL playlist: ").strip()
+                if url_input == "q":
+                    break
+
+                playlist = Playlist(url_input)
+                print("\n"+"-" * 70)
+                print(f"Playlist: {playlist.title}")
+                print(f"Chủ sở hữu: {playlist.owner}")
+                print("-" * 70)
+                type_download = self._ask_type_download()
+
+                counts = {"done": 0, "skipped": 0, "failed": 0}
+
+                def on_result(result, progress):
+                    if not result.ok:
+                        counts["failed"] += 1
+                        link, title = result.item
+                        progress.write(f"❌ Lỗi khi tải {link}: {str(result.error)}")
+                    elif result.value is None:
+                        counts["skipped"] += 1
+                    else:
+                        counts["done"] += 1
+
+                def on_post_failure(path, error):
+                    counts["done"] -= 1
+                    counts["failed"] += 1
+                    print(f"❌ Lỗi khi xử lý {path}: {str(error)}")
+
+                start_time = time.time()
+                job_batch = self.jobs.create_batch("playlist", type_download, targets=[("playlist", url_input)])
+                self._run_batch(
+                    self._playlist_options(playlist), type_download, f"Playlist",
+                    on_result=on_result, collect=False, on_post_failure=on_post_failure, job_batch=job_batch
+                )
+                print(f"\n✅ Đã tải: {counts['done']} | Bỏ qua: {counts['skipped']} | Lỗi: {counts['failed']}")
+                print(f"Thời gian tải xuống: {convert_seconds(time.time() - start_time)}")
+                input("\nNhấn Enter để tiếp tục...")
+
+            except Exception as e:
+                print(f"❌ Đã xảy ra lỗi không xác định: {str(e)}")
+                input("\nNhấn Enter để tiếp tục...")
 
     def download_video_audio_from_url(self):
         """
         Download a video from a given URL and save it to the specified output path.
         """
         while True:
+            self.configure.reload_if_changed()
             self.header._print_header("Download video/audio from URL")
             print(f"📂 Folders:")
             print(f"   🎵Audio: {self.configure.audio_folder}")
@@ -48,54 +711,95 @@ class DownloadService:
                 if url_input == "q":
                     break
 
-                yt = YouTube(url=url_input, on_progress_callback=self._on_progress)
-                print("\n"+"-" * 70)
-                print(f"Tiêu đề: {yt.title}")
-                print(f"Tác giả: {yt.author}")
-                print(f"Lượt xem: {yt.views:,}")
-                print(f"Thời lượng: {convert_seconds(yt.length)}")
-                print("-" * 70)
-                output_type = ""
-                while output_type not in ["video", "audio"]:
-                    choice = input(f"Chọn loại tải xuống (video/audio): ").lower().strip()
-                    if choice in ["video", "v"]:
-                        output_type = "video"
-                    elif choice in ["audio", "a"]:
-                        output_type = "audio"
+                archived = self.archive.entries(extract.video_id(url_input))
+                if archived:
+                    print("\n📦 Video này đã được tải trước đó:")
+                    for entry in archived:
+                        print(f"   [{entry['type']}] {entry['path']} ({convert_filesize(entry['size'])})")
+                    if input("Tải lại? (y/N): ").strip().lower() != "y":
+                        continue
+
+                batch = self.metrics.batch("url")
+                item = batch.new_item(url_input, None)
+                with self.metrics.track(item):
+                    manifest, _ = self._governed(lambda on_bytes: self.manifests.get(url_input), url_input,
+                                                 item=item, acquire=True)
+                    item.mark_resolved()
+                    item.video_id = manifest.video_id
+                    print("\n"+"-" * 70)
+                    print(f"Tiêu đề: {manifest.title}")
+                    print(f"Tác giả: {manifest.author}")
+                    print(f"Lượt xem: {manifest.views:,}")
+                    print(f"Thời lượng: {convert_seconds(manifest.length)}")
+                    print("-" * 70)
+                    output_type = ""
+                    while output_type not in ["video", "audio"]:
+                        choice = input(f"Chọn loại tải xuống (video/audio): ").lower().strip()
+                        if choice in ["video", "v"]:
+                            output_type = "video"
+                        elif choice in ["audio", "a"]:
+                            output_type = "audio"
+                        else:
+                            print(f"⚠️ Lựa chọn không hợp lệ. Vui lòng nhập 'video' hoặc 'audio'.")
+                    selected, output_path = self._select_streams(manifest.stream_query(), output_type)
+                    ds = selected[0]
+                    item.type = output_type
+                    item.itags = [s.itag for s in selected]
+                    post_process = self._needs_post_process(output_type, selected)
+                    if post_process:
+                        filename = self._file_name(manifest.title, manifest.video_id, output_type)
                     else:
-                        print(f"⚠️ Lựa chọn không hợp lệ. Vui lòng nhập 'video' hoặc 'audio'.")
-                if output_type == "video":
-                    ds = yt.streams.get_highest_resolution()
-                    output_path = self.video_folder
-                else:
-                    ds = yt.streams.get_audio_only()
-                    output_path = self.audio_folder
+                        # Giữ phần mở rộng của pytubefix (.mp4/.m4a), thêm video ID như các đường tải khác
+                        filename = (self._file_stem(manifest.title, manifest.video_id)
+                                    + os.path.splitext(ds.default_filename)[1])
+                    total_size = sum(s.filesize for s in selected)
 
-                self.header._print_header("Bắt đầu tải xuống...")
-                print(f"Tên tệp: {ds.default_filename}")
-                print(f"Kích thước: {convert_filesize(ds.filesize)}")
-                print(f"Lưu tại: {output_path}/{ds.default_filename}")
-                print("=" * 70)
-                self.progress_bar = None
-                try:
-                    self.progress_bar = tqdm(
-                        total=ds.filesize,
-                        unit='B',
-                        unit_scale=True,
+                    self.header._print_header("Bắt đầu tải xuống...")
+                    print(f"Tên tệp: {filename}")
+                    print(f"Kích thước: {convert_filesize(total_size)}")
+                    print(f"Lưu tại: {output_path}/{filename}")
+                    print("=" * 70)
+                    # Thanh tiến trình riêng cho lần tải này, không lưu trên service
+                    progress = ProgressRenderer(
+                        total=total_size,
                         desc=f"Đang tải...",
+                        max_bars=0,
                         bar_format='{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}{postfix}]'
                     )
-                    ds.download(output_path=output_path)
-                    remaining_bytes = self.progress_bar.total - self.progress_bar.n
-                    if remaining_bytes > 0:
-                        self.progress_bar.update(remaining_bytes)
-                    self.progress_bar.close()
-                    self.progress_bar = None
-                finally:
-                    # Đảm bảo thanh progress bar luôn được đóng
-                    if self.progress_bar:
-                        self.progress_bar.close()
-                        self.progress_bar = None
+                    if self.configure.download_thumbnails:
+                        self.thumbnails.fetch(manifest.video_id, manifest.thumbnail_url)
+
+                    def transfer(on_bytes):
+                        query = manifest.stream_query(
+                            on_progress_callback=lambda stream, chunk, remaining: on_bytes(len(chunk))
+                        )
+                        streams_ = [query.get_by_itag(s.itag) for s in selected]
+                        if post_process:
+                            return self._transfer_parts(streams_, output_path,
+                                                        self._file_stem(manifest.title, manifest.video_id),
+                                                        on_bytes=on_bytes)
+                        return self._transfer(streams_[0], output_path, filename, on_bytes=on_bytes)
+
+                    item.start_transfer()
+                    with progress, progress.task(filename, total_size) as task:
+                        result, received = self._governed(transfer, filename, task, item)
+                        task.update(total_size - received)
+                    item.end_transfer()
+                    file_path = result
+                    if post_process:
+                        print("🎞️ Đang xử lý bằng ffmpeg...")
+                        file_path = ds.get_file_path(filename=filename, output_path=output_path)
+                        item.start_post_process()
+                        self._submit_post_process(result, file_path)
+                        failures = self.media.wait()
+                        item.end_post_process()
+                        if failures:
+                            raise failures[0][1]
+                    self.thumbnails.wait()
+                    self._archive_item(item, manifest.video_id, output_type, ds.itag, file_path)
+                item.finish("succeeded")
+                self.metrics.record(item)
+                self.metrics.finish_batch(batch)
                 print("\n✅ Tải xuống thành công!")
                 input("\nNhấn Enter để tiếp tục...")
             except Exception as e:
@@ -113,8 +817,8 @@ class DownloadService:
         """
         Download a video from a given keyword and save it to the specified output path.
         """
-        video_id_list = []
         while True:
+            self.configure.reload_if_changed()
             self.header._print_header("Download video/audio from keyword")
             print(f"📂 Folders:")
             print(f"   🎵Audio: {self.configure.audio_folder}")
@@ -127,27 +831,39 @@ class DownloadService:
                 if keyword == "q":
                     break
 
-                results = Search(query=keyword)
                 print("\nSearching...")
-                print(""+"-" * 70)
-                for i, result in enumerate(results.videos):
-                    video_id_list.append([
-                        f"https://www.youtube.com/watch?v={result.video_id}",
-                        result.title
-                    ])
-                    print(f"|     ID: {result.video_id}")
-                    print(f"|     Tiêu đề: {result.title}")
-                    print(f"[{i+1}]  Tác giả: {result.author}")
-                    print(f"|     Lượt xem: {result.views:,}")
-                    print(f"|     Thời lượng: {convert_seconds(result.length)}")
-                    print("-" * 70)
+                results = self.searches.search(keyword)
+                printed = 0
+                while True:
+                    # Chỉ màn hình này cần tác giả, lượt xem và thời lượng
+                    results.warm()
+                    print(""+"-" * 70)
+                    for i, result in enumerate(results.videos[printed:], start=printed):
+                        print(f"|     ID: {result.video_id}")
+                        print(f"|     Tiêu đề: {result.title}")
+                        print(f"[{i+1}]  Tác giả: {result.author}")
+                        print(f"|     Lượt xem: {result.views:,}")
+                        print(f"|     Thời lượng: {convert_seconds(result.length)}")
+                        print("-" * 70)
+                    printed = len(results.videos)
 
+                    print("\n💡 Chọn nhiều lựa chọn bằng cách nhập các số, cách nhau bởi dấu phẩy (,)")
+                    print("    Ví dụ: 1,3,5 sẽ chọn lựa chọn 1, 3 và 5")
+                    print("    Nhập 'all' để chọn tất cả các lựa chọn")
+                    if results.has_more:
+                        print("    Nhập 'm' để xem thêm kết quả")
 
-                print("\n💡 Chọn nhiều lựa chọn bằng cách nhập các số, cách nhau bởi dấu phẩy (,)")
-                print("    Ví dụ: 1,3,5 sẽ chọn lựa chọn 1, 3 và 5")
-                print("    Nhập 'all' để chọn tất cả các lựa chọn")
-                
-                choice = input("\n🔢 Nhập lựa chọn của bạn (hoặc 'q' để quay lại): ")
+                    choice = input("\n🔢 Nhập lựa chọn của bạn (hoặc 'q' để quay lại): ")
+                    if choice.lower() == 'm' and results.has_more:
+                        print("\nSearching...")
+                        results.load_more()
+                        continue
+                    break
+
+                video_id_list = [
+                    [f"https://www.youtube.com/watch?v={result.video_id}", result.title]
+                    for result in results.videos
+                ]
 
                 if choice.lower() == 'q':
                     return
@@ -183,45 +899,12 @@ class DownloadService:
                 print("=" * 70)
                 for i, (link, title) in enumerate(option_to_choice):
                     print(f"[{i+1}] - {title}")
-                type_download = input("Chọn loại tải xuống (video/audio): ").strip()
-                while type_download not in ["video", "audio"]:
-                    choice = input(f"Chọn loại tải xuống (video/audio): ").lower().strip()
-                    if choice in ["video", "v"]:
-                        type_download = "video"
-                    elif choice in ["audio", "a"]:
-                        type_download = "audio"
-                    else:
-                        print(f"⚠️ Lựa chọn không hợp lệ. Vui lòng nhập 'video' hoặc 'audio'.")
+                type_download = self._ask_type_download()
                 start_time = time.time()
-                total_size = 0
-                for link, title in option_to_choice:
-                    yt = YouTube(url=link)
-                    if type_download == "video":
-                        ds = yt.streams.get_highest_resolution()
-                    else:
-                        ds = yt.streams.get_audio_only()
-                    total_size += ds.filesize
-
-                with tqdm(total=total_size, unit='B', unit_scale=True, desc=f"Tổng ({len(option_to_choice)} lựa chọn)") as pbar:
-                    for i, (link, title) in enumerate(option_to_choice):
-                        yt = YouTube(url=link, on_progress_callback=self._on_progress)
-                        if type_download == "video":
-                            ds = yt.streams.get_highest_resolution()
-                            output_path = self.video_folder
-                        else:
-                            ds = yt.streams.get_audio_only()
-                            output_path = self.audio_folder
-
-                        try:
-                            self.bytes_downloaded_in_current_file = 0
-                            ds.download(output_path=output_path, filename=title+".mp4" if type_download == "video" else title+".mp3")
-                            pbar.update(ds.filesize)
-                            time.sleep(1)
-                        except Exception as e:
-                            print(f"❌ Lỗi khi tải {title}: {str(e)}")
-                        finally:
-                            pass # No need to close the progress bar here
-                self.progress_bar = None
+                job_batch = self.jobs.create_batch("keyword", type_download, options=option_to_choice)
+                results = self._run_batch(option_to_choice, type_download, f"Tổng ({len(option_to_choice)} lựa chọn)",
+                                          job_batch=job_batch)
+                self._print_batch_summary(results)
                 end_time = time.time()
                 print(f"Thời gian tải xuống: {convert_seconds(end_time - start_time)}")
                 input("\nNhấn Enter để tiếp tục...")
@@ -0,0 +1,323 @@
+import os
+import time
+import atexit
+import asyncio
+import threading
+
+import aiohttp
+
+from .transfer import (
+    DEFAULT_CHUNK_SIZE, READ_SIZE, TransferError, TransferCancelled,
+    open_part, open_part_fd, finalize_part, split_pieces, parse_retry_after
+)
+
+HEADERS = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
+# Gom các khối nhận được thành lần ghi cỡ này, thực hiện ngoài vòng lặp sự kiện
+WRITE_SIZE = 1024 * 1024
+
+
+class TransferTask:
+    """
+    Progress and state of a single transfer, owned by the task itself.
+
+    Setting `cancelled` (a `threading.Event`, e.g. the batch's) stops the
+    transfer at its next chunk with `TransferCancelled`.
+    """
+
+    def __init__(self, url: str, file_path: str, filesize: int, on_progress=None, connections: int = 1,
+                 cancelled: threading.Event = None):
+        self.url = url
+        self.file_path = file_path
+        self.filesize = filesize
+        self.on_progress = on_progress
+        self.connections = connections
+        self.cancelled = cancelled
+        self.bytes_done = 0
+        self.state = "pending"
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+
+    def advance(self, n: int):
+        self.bytes_done += n
+        if self.on_progress:
+            self.on_progress(n)
+
+    def check(self):
+        if self.cancelled is not None and self.cancelled.is_set():
+            raise TransferCancelled(f"Đã huỷ khi đang tải {self.file_path}")
+
+
+class AsyncTransferEngine:
+    """
+    Asyncio transfer core built on one pooled aiohttp session.
+
+    Transfers run as tasks on an event loop in a background thread, so many
+    downloads share a handful of sockets and a single thread. Disk work
+    (writes, fsync, journal saves, the final rename) runs in the default
+    executor, so a slow disk never stalls the sockets. Callers on the loop
+    await `transfer`; `call`, `download`, `download_many` and `submit` are
+    the synchronous facade for threads.
+    """
+
+    def __init__(self, max_connections: int = 64, chunk_size: int = DEFAULT_CHUNK_SIZE, timeout: float = 30,
+                 governor=None):
+        self.max_connections = max_connections
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.governor = governor
+
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._started = threading.Lock()
+
+    # ---- event loop ----------------------------------------------------
+
+    def _ensure_loop(self):
+        with self._started:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="transfer-engine", daemon=True)
+                self._thread.start()
+                # Đóng session gọn gàng khi thoát chương trình
+                atexit.register(self.close)
+        return self._loop
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout),
+                headers=HEADERS,
+                auto_decompress=False,
+            )
+        return self._session
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._session = None
+
+    # ---- async core ----------------------------------------------------
+
+    async def _fetch_range(self, task: TransferTask, fd: int, start: int, end: int, journal):
+        session = await self._get_session()
+        if self.governor:
+            await self.governor.requests.acquire_async()
+        async with session.get(task.url, headers={"Range": f"bytes={start}-{end - 1}"}) as response:
+            if response.status >= 400:
+                raise TransferError(
+                    f"HTTP {response.status} khi tải byte {start}-{end - 1}",
+                    status=response.status, retry_after=parse_retry_after(response.headers.get("Retry-After"))
+                )
+            # HTTP 200 chỉ chấp nhận được khi đọc từ đầu tệp
+            if response.status != 206 and start != 0:
+                raise TransferError(f"Máy chủ không hỗ trợ tải theo range (HTTP {response.status})",
+                                    status=response.status)
+            position = start
+            written = start
+            buffer = bytearray()
+            try:
+                async for chunk in response.content.iter_chunked(READ_SIZE):
+                    chunk = chunk[:end - position]
+                    buffer += chunk
+                    position += len(chunk)
+                    task.advance(len(chunk))
+                    if len(buffer) >= WRITE_SIZE:
+                        written = await self._write(fd, buffer, written, journal)
+                        buffer = bytearray()
+                    if self.governor:
+                        await self.governor.bandwidth.acquire_async(len(chunk))
+                    if position >= end:
+                        break
+                    task.check()
+            finally:
+                # Phần đã nhận vẫn được ghi khi kết nối lỗi, để lần sau tiếp tục từ đó
+                if buffer:
+                    await self._write(fd, buffer, written, journal)
+        if position < end:
+            raise TransferError(f"Kết nối bị đóng sớm tại byte {position}/{end}")
+
+    @staticmethod
+    async def _write(fd: int, data: bytearray, offset: int, journal):
+        """Write `data` at `offset` off the loop, then journal it; returns the offset after it."""
+        end = offset + len(data)
+
+        def write():
+            os.pwrite(fd, data, offset)
+            if journal.add(offset, end):
+                journal.save(fd)
+
+        await asyncio.to_thread(write)
+        return end
+
+    @staticmethod
+    def _open(task: TransferTask):
+        part_path, journal = open_part(task.file_path, task.filesize)
+        fd = open_part_fd(part_path)
+        try:
+            os.ftruncate(fd, task.filesize)
+        except BaseException:
+            os.close(fd)
+            raise
+        return part_path, journal, fd
+
+    @staticmethod
+    def _close(fd: int, journal):
+        try:
+            journal.save(fd)
+        finally:
+            os.close(fd)
+
+    async def fetch(self, task: TransferTask, connections: int = 1):
+        """
+        Download `task` into `<file>.part`, resuming from its journal, then
+        verify and rename it. With `connections > 1` the missing ranges are
+        fetched concurrently; all of them write with `os.pwrite` to one
+        descriptor, and the journal is saved only after an fsync.
+        """
+        task.check()
+        task.state = "running"
+        task.started_at = time.time()
+        part_path, journal, fd = await asyncio.to_thread(self._open, task)
+        if journal.completed:
+            task.advance(journal.completed)
+
+        pieces = split_pieces(journal, self.chunk_size, connections)
+        pieces.reverse()
+
+        async def worker():
+            while pieces:
+                task.check()
+                start, end = pieces.pop()
+                await self._fetch_range(task, fd, start, end, journal)
+
+        workers = [
+            asyncio.ensure_future(worker())
+            for _ in range(min(max(1, connections), len(pieces)))
+        ]
+        try:
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                # Một kết nối lỗi hoặc bị huỷ thì dừng luôn các kết nối còn lại
+                for pending in workers:
+                    pending.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                raise
+            os.close(fd)
+            fd = None
+            await asyncio.to_thread(finalize_part, task.file_path, part_path, journal, task.filesize)
+            task.state = "done"
+        except (asyncio.CancelledError, TransferCancelled):
+            task.state = "cancelled"
+            raise
+        except Exception as e:
+            task.state = "failed"
+            task.error = e
+            raise
+        finally:
+            if fd is not None:
+                # Lưu journal trên luồng khác; chờ xong kể cả khi task bị huỷ lần nữa
+                await asyncio.shield(asyncio.to_thread(self._close, fd, journal))
+            task.finished_at = time.time()
+        return task.file_path
+
+    async def transfer(self, task: TransferTask):
+        """`fetch` on `task.connections` connections, unless the target file is already complete."""
+        if finalize_existing(task):
+            return task.file_path
+        return await self.fetch(task, task.connections)
+
+    async def get_bytes(self, url: str):
+        """Fetch a small resource (e.g. a thumbnail) over the pooled session."""
+        session = await self._get_session()
+        if self.governor:
+            await self.governor.requests.acquire_async()
+        async with session.get(url) as response:
+            if response.status >= 400:
+                raise TransferError(f"HTTP {response.status} khi tải {url}", status=response.status)
+            return await response.read()
+
+    # ---- sync facade ---------------------------------------------------
+
+    def run(self, coroutine):
+        """Schedule any coroutine on the engine loop and return a `concurrent.futures.Future`."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+
+    def call(self, coroutine, timeout: float = None):
+        """Run a coroutine on the engine loop and wait for it; Ctrl+C cancels it."""
+        if timeout:
+            coroutine = asyncio.wait_for(coroutine, timeout)
+        future = self.run(coroutine)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def submit(self, task: TransferTask, connections: int = None, timeout: float = None):
+        """Schedule `task` on the engine and return a `concurrent.futures.Future`."""
+        coroutine = self.fetch(task, task.connections if connections is None else connections)
+        if timeout:
+            coroutine = asyncio.wait_for(coroutine, timeout)
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+
+    def download(self, url: str, file_path: str, filesize: int, on_progress=None,
+                 connections: int = 1, timeout: float = None, cancelled: threading.Event = None):
+        """
+        Download `url` to `file_path`, resuming a previous `.part` file if
+        any, and wait for it. `on_progress(n)` is called with the number of
+        new bytes, including the bytes already present when resuming.
+
+        Ctrl+C (or setting `cancelled` from another thread) cancels the
+        underlying task; its journal is kept for resuming.
+        """
+        task = TransferTask(url, file_path, filesize, on_progress, connections, cancelled)
+        return self.call(self.transfer(task), timeout)
+
+    def download_many(self, tasks, connections: int = None, timeout: float = None):
+        """
+        Run many tasks concurrently on the single engine thread and wait for all
+        of them; `connections` overrides each task's own. Returns `(task, error)`
+        pairs; `error` is None on success.
+        """
+        futures = []
+        for task in tasks:
+            if finalize_existing(task):
+                futures.append((task, None))
+            else:
+                futures.append((task, self.submit(task, connections, timeout)))
+        results = []
+        try:
+            for task, future in futures:
+                if future is None:
+                    results.append((task, None))
+                    continue
+                try:
+                    future.result()
+                    results.append((task, None))
+                except Exception as e:
+                    results.append((task, e))
+        except BaseException:
+            for _, future in futures:
+                if future is not None:
+                    future.cancel()
+            raise
+        return results
+
+
+def finalize_existing(task: TransferTask):
+    """Treat an already complete target file as a finished task."""
+    if os.path.isfile(task.file_path) and os.path.getsize(task.file_path) == task.filesize:
+        task.advance(task.filesize)
+        task.state = "done"
+        return True
+    return False
@@ -0,0 +1,205 @@
+import time
+import random
+import socket
+import asyncio
+import threading
+import http.client
+from urllib.error import URLError
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - aiohttp là phụ thuộc tuỳ chọn
+    aiohttp = None
+
+from pytubefix.exceptions import VideoUnavailable, LoginRequired, RegexMatchError
+
+from .transfer import READ_SIZE, TransferError, TransferCancelled
+from ..utils.config import Configure
+
+# Cách xử lý một lỗi
+RETRY = "retry"          # lỗi mạng tạm thời, thử lại sau một khoảng chờ
+THROTTLED = "throttled"  # HTTP 429, cả tiến trình cùng chậm lại
+REFRESH = "refresh"      # URL đã ký hết hạn, phân giải lại manifest rồi thử lại
+FATAL = "fatal"          # thử lại cũng không thay đổi kết quả
+
+# Khoảng kiểm tra lệnh huỷ khi chờ thử lại trên vòng lặp sự kiện
+CANCEL_POLL = 0.1
+
+_TRANSIENT = (
+    ConnectionError, TimeoutError, socket.timeout, asyncio.TimeoutError,
+    URLError, http.client.IncompleteRead, http.client.RemoteDisconnected,
+)
+
+
+def classify(error: Exception):
+    """Classify an error raised while resolving or transferring as RETRY, THROTTLED, REFRESH or FATAL."""
+    if isinstance(error, (VideoUnavailable, LoginRequired, RegexMatchError, ValueError, TransferCancelled)):
+        return FATAL
+    status = getattr(error, "status", None) or getattr(error, "code", None)
+    if isinstance(status, int):
+        if status == 429:
+            return THROTTLED
+        if status in (403, 410):
+            return REFRESH
+        if status == 408 or status >= 500:
+            return RETRY
+        return FATAL
+    if isinstance(error, TransferError) or isinstance(error, _TRANSIENT):
+        return RETRY
+    if aiohttp is not None and isinstance(error, aiohttp.ClientError):
+        return RETRY
+    return FATAL
+
+
+class TokenBucket:
+    """
+    Token bucket shared by worker threads and the engine loop.
+
+    Callers take tokens immediately and sleep off any debt, so the long-run
+    rate never exceeds `rate` while bursts up to `burst` go through at once.
+    A `rate` of 0 disables the bucket.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate or 0)
+        self.burst = max(float(burst or 0), 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float, burst: float):
+        """Change the rate and burst in place, keeping the tokens (or debt) already accrued."""
+        with self._lock:
+            was_enabled = self.rate > 0
+            self.rate = float(rate or 0)
+            self.burst = max(float(burst or 0), 1.0)
+            if was_enabled:
+                self._tokens = min(self._tokens, self.burst)
+            else:
+                # Vừa bật lại: bắt đầu với một bucket đầy
+                self._tokens = self.burst
+                self._updated = time.monotonic()
+
+    def reserve(self, tokens: float = 1):
+        """Take `tokens` and return how long the caller has to wait for them."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def pause(self, seconds: float):
+        """Make every caller wait at least `seconds` longer, e.g. after a 429."""
+        if self.rate > 0 and seconds > 0:
+            self.reserve(seconds * self.rate)
+
+    def acquire(self, tokens: float = 1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class Governor:
+    """
+    Retry policy, request rate limit and global bandwidth cap shared by every
+    resolve and transfer of a `DownloadService`.
+
+    Errors are classified with `classify`; retryable ones are retried with
+    exponential backoff and full jitter, honouring `Retry-After`. A 429 also
+    pauses the shared request bucket, so the whole process backs off instead
+    of every worker hitting the limit in turn.
+    """
+
+    def __init__(self, configure: Configure):
+        self.requests = TokenBucket(0, 1)
+        self.bandwidth = TokenBucket(0, 1)
+        self.apply(configure)
+
+    def apply(self, configure: Configure):
+        """Take (new) settings from `configure.governor`; the buckets are updated in place."""
+        options = configure.governor
+        self.max_retries = max(0, int(options['max_retries']))
+        self.backoff_base = float(options['backoff_base'])
+        self.backoff_max = float(options['backoff_max'])
+        self.requests.set_rate(options['requests_per_second'], options['request_burst'])
+        bandwidth = options['max_bandwidth']
+        # Cho phép dồn tối đa ~1/4 giây băng thông để đọc theo khối không bị giật
+        self.bandwidth.set_rate(bandwidth, max(READ_SIZE, bandwidth / 4))
+
+    def backoff(self, attempt: int, error: Exception = None):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = getattr(error, "retry_after", None)
+        return max(delay, retry_after) if retry_after else delay
+
+    def call(self, fn, on_retry=None, on_refresh=None, acquire: bool = True, cancelled: threading.Event = None):
+        """
+        Call `fn()` until it succeeds, a FATAL error occurs or `max_retries`
+        retries are used up.
+
+        `on_retry(attempt, error, delay)` runs before each wait. REFRESH errors
+        are only retried when `on_refresh(error)` is given to renew what
+        expired. With `acquire`, each attempt first takes a request token;
+        transfers take theirs per range request instead. Setting `cancelled`
+        ends a backoff wait with `TransferCancelled`.
+        """
+        attempt = 0
+        while True:
+            if acquire:
+                self.requests.acquire()
+            try:
+                return fn()
+            except Exception as e:
+                kind, delay = self._retry(attempt, e, on_retry, on_refresh)
+                if kind is None:
+                    raise
+                if cancelled is None:
+                    time.sleep(delay)
+                elif cancelled.wait(delay):
+                    raise TransferCancelled("Đã huỷ trong lúc chờ thử lại") from e
+                if kind == REFRESH:
+                    on_refresh(e)
+                attempt += 1
+
+    async def call_async(self, fn, on_retry=None, on_refresh=None, cancelled: threading.Event = None):
+        """
+        `call` for coroutines on the transfer engine's loop: `fn()` returns an
+        awaitable, backoff waits do not block the loop and `on_refresh` runs
+        in a worker thread. Transfers take their request tokens per range
+        request, so there is no `acquire`.
+        """
+        attempt = 0
+        while True:
+            try:
+                return await fn()
+            except Exception as e:
+                kind, delay = self._retry(attempt, e, on_retry, on_refresh)
+                if kind is None:
+                    raise
+                deadline = time.monotonic() + delay
+                while time.monotonic() < deadline:
+                    if cancelled is not None and cancelled.is_set():
+                        raise TransferCancelled("Đã huỷ trong lúc chờ thử lại") from e
+                    await asyncio.sleep(min(CANCEL_POLL, deadline - time.monotonic()))
+                if kind == REFRESH:
+                    await asyncio.to_thread(on_refresh, e)
+                attempt += 1
+
+    def _retry(self, attempt: int, error: Exception, on_retry=None, on_refresh=None):
+        """`(kind, delay)` of the wait before retrying `error`, or `(None, None)` when it must be raised."""
+        kind = classify(error)
+        if kind == FATAL or attempt >= self.max_retries or (kind == REFRESH and on_refresh is None):
+            return None, None
+        delay = self.backoff(attempt, error)
+        if kind == THROTTLED:
+            self.requests.pause(delay)
+        if on_retry:
+            on_retry(attempt + 1, error, delay)
+        return kind, delay
@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from ..utils.config import Configure
+
+PENDING = "pending"
+RESOLVING = "resolving"
+DOWNLOADING = "downloading"
+DONE = "done"
+FAILED = "failed"
+
+# Một lô thuộc về tiến trình giữ lease; lease được gia hạn định kỳ khi tiến trình còn sống
+LEASE_SECONDS = 30
+HEARTBEAT_INTERVAL = 10
+
+
+class JobQueue:
+    """
+    Persistent queue of batch items, stored in SQLite under `project_root`.
+
+    A batch records what was asked for (type, quality and the targets to
+    expand); each of its items is a job whose state moves through
+    pending -> resolving -> downloading -> done/failed. Every transition is
+    committed immediately, so after a crash or Ctrl+C the unfinished jobs
+    can be picked up again without repeating finished ones.
+
+    A batch is run by the queue that holds its lease (`owner`, renewed every
+    few seconds by a heartbeat thread while the batch runs). Other processes
+    sharing the database only take over a batch whose lease has expired, so
+    a batch is never run twice at once.
+    """
+
+    def __init__(self, configure: Configure):
+        self.path = os.path.join(configure.project_root, "jobs.sqlite3")
+        os.makedirs(configure.project_root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._listeners = []
+        # Định danh của tiến trình (và của hàng đợi này) trong cột owner
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._owned = set()
+        self._heartbeat = None
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS batches ("
+                " id INTEGER PRIMARY KEY,"
+                " desc TEXT NOT NULL,"
+                " type TEXT NOT NULL,"
+                " quality TEXT,"
+                " targets TEXT,"
+                " keyword_limit INTEGER,"
+                " expanded INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL,"
+                " finished_at REAL"
+                ")"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY,"
+                " batch_id INTEGER NOT NULL REFERENCES batches(id),"
+                " url TEXT NOT NULL,"
+                " title TEXT,"
+                " state TEXT NOT NULL,"
+                " error TEXT,"
+                " path TEXT,"
+                " updated_at REAL NOT NULL,"
+                " UNIQUE (batch_id, url)"
+                ")"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (batch_id, state)")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(batches)")}
+            # Cơ sở dữ liệu của phiên bản trước chưa có cột lease
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE batches ADD COLUMN owner TEXT")
+            if "lease_until" not in columns:
+                self._conn.execute("ALTER TABLE batches ADD COLUMN lease_until REAL")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _own(self, batch_id: int):
+        with self._lock:
+            self._owned.add(batch_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._renew_leases, name="job-lease", daemon=True)
+                self._heartbeat.start()
+
+    def _renew_leases(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                owned = list(self._owned)
+                if owned:
+                    self._conn.execute(
+                        f"UPDATE batches SET lease_until = ? WHERE owner = ? AND id IN ({','.join('?' * len(owned))})",
+                        (time.time() + LEASE_SECONDS, self.owner, *owned)
+                    )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def create_batch(self, desc: str, type_download: str, quality: str = None, targets=None,
+                     keyword_limit: int = None, options=None):
+        """
+        Record a new batch, leased to this queue. `targets` are the
+        `(kind, value)` pairs it expands from, kept so an interrupted
+        expansion can be resumed. Explicit `(link, title)` `options` are
+        stored as pending jobs in the same transaction, so the batch is
+        complete on disk before any of them runs.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO batches (desc, type, quality, targets, keyword_limit, expanded, created_at,"
+                " owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (desc, type_download, quality, json.dumps(list(targets)) if targets is not None else None,
+                 keyword_limit, int(options is not None), now, self.owner, now + LEASE_SECONDS)
+            )
+            batch_id = cursor.lastrowid
+            if options is not None:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (batch_id, url, title, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    [(batch_id, link, title, PENDING, now) for link, title in options]
+                )
+        self._own(batch_id)
+        return batch_id
+
+    def feed(self, batch_id: int, options):
+        """
+        Persist `(link, title)` options as pending jobs while yielding them.
+
+        Options whose job is already done, failed or being worked on are not
+        yielded again, nor are duplicates within the batch: the jobs table's
+        UNIQUE (batch_id, url) keeps one job per link, and a job is only
+        yielded by moving it out of the pending state, so nothing per option
+        is held in memory. A batch expanded from targets is marked as fully
+        expanded once `options` is exhausted; one created with explicit
+        options already is.
+        """
+        for link, title in options:
+            now = time.time()
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO jobs (batch_id, url, title, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (batch_id, link, title, PENDING, now)
+                )
+                # Lô bị dừng giữa chừng: `claim` trả các job này về pending cho lần chạy sau
+                taken = self._conn.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE batch_id = ? AND url = ? AND state = ?",
+                    (RESOLVING, now, batch_id, link, PENDING)
+                ).rowcount == 1
+            if taken:
+                yield link, title
+        with self._lock:
+            # Lô không có targets chỉ có thể đã đủ mục từ lúc tạo
+            self._conn.execute("UPDATE batches SET expanded = 1 WHERE id = ? AND targets IS NOT NULL", (batch_id,))
+
+    def subscribe(self, listener):
+        """Call `listener(batch_id, url, state, error, path)` after every job state change."""
+        self._listeners.append(listener)
+
+    def set_state(self, batch_id: int, url: str, state: str, error: str = None, path: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, path = COALESCE(?, path), updated_at = ?"
+                " WHERE batch_id = ? AND url = ?",
+                (state, error, path, time.time(), batch_id, url)
+            )
+        for listener in self._listeners:
+            listener(batch_id, url, state, error, path)
+
+    def pending(self, batch_id: int):
+        """The batch's pending jobs as `(link, title)` options, in queue order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, title FROM jobs WHERE batch_id = ? AND state = ? ORDER BY id", (batch_id, PENDING)
+            ).fetchall()
+        return [(url, title) for url, title in rows]
+
+    def failed(self, batch_id: int):
+        """The batch's failed jobs as `(link, title, error)`, in queue order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, title, error FROM jobs WHERE batch_id = ? AND state = ? ORDER BY id", (batch_id, FAILED)
+            ).fetchall()
+        return [(url, title, error) for url, title, error in rows]
+
+    def claim(self, batch_id: int):
+        """
+        Take the lease of an unfinished batch that no live process holds and
+        return its jobs left resolving/downloading by the previous owner to
+        the pending state, atomically. Returns the batch (see `batch`), or
+        None when another process holds it or it is finished.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            claimed = conn.execute(
+                "UPDATE batches SET owner = ?, lease_until = ? WHERE id = ? AND finished_at IS NULL"
+                " AND (owner IS NULL OR lease_until IS NULL OR lease_until < ?)",
+                (self.owner, now + LEASE_SECONDS, batch_id, now)
+            ).rowcount == 1
+            if claimed:
+                conn.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE batch_id = ? AND state IN (?, ?)",
+                    (PENDING, now, batch_id, RESOLVING, DOWNLOADING)
+                )
+        if not claimed:
+            return None
+        self._own(batch_id)
+        return self.batch(batch_id)
+
+    def release(self, batch_id: int):
+        """Give up the lease of a batch this queue stopped running, finished or not."""
+        with self._lock:
+            self._owned.discard(batch_id)
+            self._conn.execute(
+                "UPDATE batches SET owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+                (batch_id, self.owner)
+            )
+
+    def close_batch(self, batch_id: int):
+        """Mark the batch finished if it is fully expanded and none of its jobs is left to do."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE batches SET finished_at = ? WHERE id = ? AND expanded = 1 AND NOT EXISTS ("
+                " SELECT 1 FROM jobs WHERE batch_id = ? AND state NOT IN (?, ?))",
+                (time.time(), batch_id, batch_id, DONE, FAILED)
+            )
+
+    def counts(self, batch_id: int):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY state", (batch_id,)
+            ).fetchall()
+        return dict(rows)
+
+    _BATCH_COLUMNS = ("id, desc, type, quality, targets, keyword_limit, expanded, created_at, finished_at,"
+                      " owner, lease_until")
+
+    def _batch_dict(self, row):
+        (batch_id, desc, type_download, quality, targets, keyword_limit, expanded, created_at, finished_at,
+         owner, lease_until) = row
+        return {
+            "id": batch_id,
+            "desc": desc,
+            "type": type_download,
+            "quality": quality,
+            "targets": [tuple(target) for target in json.loads(targets)] if targets else None,
+            "keyword_limit": keyword_limit,
+            "expanded": bool(expanded),
+            "created_at": created_at,
+            "finished_at": finished_at,
+            "owner": owner,
+            "lease_until": lease_until,
+            "counts": self.counts(batch_id),
+        }
+
+    def batch(self, batch_id: int):
+        """One batch as a dict (see `unfinished`), or None if it does not exist."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._BATCH_COLUMNS} FROM batches WHERE id = ?", (batch_id,)
+            ).fetchone()
+        return self._batch_dict(row) if row else None
+
+    def batches(self, limit: int = 50):
+        """The most recent batches, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._BATCH_COLUMNS} FROM batches ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._batch_dict(row) for row in rows]
+
+    def items(self, batch_id: int):
+        """The batch's jobs in queue order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, title, state, error, path, updated_at FROM jobs WHERE batch_id = ? ORDER BY id",
+                (batch_id,)
+            ).fetchall()
+        return [
+            {"url": url, "title": title, "state": state, "error": error, "path": path, "updated_at": updated_at}
+            for url, title, state, error, path, updated_at in rows
+        ]
+
+    def leased(self, job_batch: dict):
+        """Whether a live process (this one included) holds the batch's lease."""
+        return job_batch["lease_until"] is not None and job_batch["lease_until"] >= time.time()
+
+    def unfinished(self):
+        """
+        Batches that still have work: pending jobs or an incomplete expansion.
+        They may be leased by a running process; `claim` one before running it.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._BATCH_COLUMNS} FROM batches WHERE finished_at IS NULL ORDER BY id"
+            ).fetchall()
+        batches = []
+        for row in rows:
+            job_batch = self._batch_dict(row)
+            counts = job_batch["counts"]
+            if job_batch["expanded"] and not any(counts.get(state) for state in (PENDING, RESOLVING, DOWNLOADING)):
+                self.close_batch(job_batch["id"])
+                continue
+            batches.append(job_batch)
+        return batches
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
+
+from pytubefix import YouTube, extract
+from pytubefix.monostate import Monostate
+from pytubefix.query import StreamQuery
+from pytubefix.streams import Stream
+
+from ..utils.config import Configure
+
+# Bỏ qua manifest khi URL đã ký còn ít hơn khoảng thời gian này
+EXPIRY_MARGIN = 10 * 60
+
+
+def _stream_to_dict(stream: Stream):
+    """Rebuild the raw stream dict that :class:`Stream` was constructed from."""
+    data = {
+        "url": stream.url,
+        "itag": stream.itag,
+        "mimeType": f'{stream.mime_type}; codecs="{", ".join(stream.codecs)}"',
+        "is_otf": stream.is_otf,
+        "bitrate": stream.bitrate,
+        "contentLength": stream._filesize,
+        "approxDurationMs": stream.durationMs,
+        "lastModified": stream.last_Modified,
+        "isDrc": stream.is_drc,
+        "is_sabr": stream.is_sabr,
+    }
+    if stream.xtags:
+        data["xtags"] = stream.xtags
+    if hasattr(stream, "fps"):
+        data["fps"] = stream.fps
+    if stream._width:
+        data["width"] = stream._width
+    if stream._height:
+        data["height"] = stream._height
+    if stream.includes_multiple_audio_tracks:
+        # Video lồng tiếng nhiều thứ tiếng: giữ lại để còn chọn đúng bản âm thanh gốc
+        data["audioTrack"] = {
+            "audioIsDefault": stream.is_default_audio_track,
+            "displayName": stream.audio_track_name_regionalized,
+            "id": stream.audio_track_language_id_regionalized,
+        }
+    return data
+
+
+def _url_expiry(url: str):
+    try:
+        return int(parse_qs(urlparse(url).query)["expire"][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+class VideoManifest:
+    """
+    Metadata and signed stream list of one video, resolved once and reusable.
+
+    SABR streams can only be downloaded through the `YouTube` object that
+    resolved them (its PO token, ustreamer config and session), so a manifest
+    containing any keeps that object in `youtube` and is never cached.
+    """
+
+    def __init__(self, video_id: str, title: str, author: str, views: int, length: int,
+                 thumbnail_url: str, streams: list, resolved_at: float = None, youtube: YouTube = None):
+        self.video_id = video_id
+        self.title = title
+        self.author = author
+        self.views = views
+        self.length = length
+        self.thumbnail_url = thumbnail_url
+        self.streams = streams
+        self.resolved_at = resolved_at or time.time()
+        self.youtube = youtube
+
+        expiries = [e for e in (_url_expiry(s["url"]) for s in streams) if e]
+        self.expires_at = min(expiries) if expiries else None
+
+    @classmethod
+    def from_youtube(cls, yt: YouTube):
+        streams = yt.fmt_streams
+        return cls(
+            video_id=yt.video_id,
+            title=yt.title,
+            author=yt.author,
+            views=yt.views,
+            length=yt.length,
+            thumbnail_url=yt.thumbnail_url,
+            streams=[_stream_to_dict(stream) for stream in streams],
+            youtube=yt if any(stream.is_sabr for stream in streams) else None,
+        )
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data)
+
+    @property
+    def sabr(self):
+        return any(data.get("is_sabr") for data in self.streams)
+
+    def to_dict(self):
+        return {
+            "video_id": self.video_id,
+            "title": self.title,
+            "author": self.author,
+            "views": self.views,
+            "length": self.length,
+            "thumbnail_url": self.thumbnail_url,
+            "streams": self.streams,
+            "resolved_at": self.resolved_at,
+        }
+
+    def is_fresh(self, ttl: float):
+        now = time.time()
+        if now - self.resolved_at > ttl:
+            return False
+        return self.expires_at is None or now < self.expires_at - EXPIRY_MARGIN
+
+    def stream_query(self, on_progress_callback=None, on_complete_callback=None):
+        """
+        Build a fresh :class:`StreamQuery` over the cached streams.
+
+        Each call gets its own monostate, so concurrent downloads of the same
+        video keep separate progress callbacks.
+        """
+        monostate = Monostate(
+            on_progress=on_progress_callback,
+            on_complete=on_complete_callback,
+            title=self.title,
+            duration=self.length,
+            youtube=self.youtube,
+        )
+        po_token = self.youtube.po_token if self.youtube else None
+        ustreamer_config = self.youtube.video_playback_ustreamer_config if self.youtube else None
+        return StreamQuery([
+            Stream(stream=dict(data), monostate=monostate, po_token=po_token,
+                   video_playback_ustreamer_config=ustreamer_config)
+            for data in self.streams
+        ])
+
+
+class ManifestCache:
+    """
+    Video manifests keyed by video ID: an in-memory LRU backed by an optional
+    on-disk JSON store under `project_root`. Expired files in the store are
+    pruned when the cache is created.
+    """
+
+    def __init__(self, configure: Configure):
+        self.configure = configure
+        options = configure.manifest_cache
+        self.capacity = max(1, int(options.get("capacity", 256)))
+        self.ttl = float(options.get("ttl", 6 * 3600))
+        self.on_disk = bool(options.get("on_disk", True))
+        self.cache_folder = os.path.join(configure.project_root, "cache", "manifests")
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._resolving = {}
+
+        if self.on_disk:
+            os.makedirs(self.cache_folder, exist_ok=True)
+            self.prune()
+
+    def prune(self):
+        """Delete on-disk manifests older than `ttl` and leftover temporary files."""
+        now = time.time()
+        for name in os.listdir(self.cache_folder):
+            path = os.path.join(self.cache_folder, name)
+            try:
+                if name.endswith(".tmp") or now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _disk_path(self, video_id: str):
+        return os.path.join(self.cache_folder, f"{video_id}.json")
+
+    def _remember(self, manifest: VideoManifest):
+        with self._lock:
+            self._entries[manifest.video_id] = manifest
+            self._entries.move_to_end(manifest.video_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def _lookup(self, video_id: str):
+        with self._lock:
+            manifest = self._entries.get(video_id)
+            if manifest is not None:
+                if manifest.is_fresh(self.ttl):
+                    self._entries.move_to_end(video_id)
+                    return manifest
+                del self._entries[video_id]
+
+        if not self.on_disk:
+            return None
+        try:
+            with open(self._disk_path(video_id), "r", encoding="utf-8") as f:
+                manifest = VideoManifest.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+        if not manifest.is_fresh(self.ttl):
+            self._remove(video_id)
+            return None
+        self._remember(manifest)
+        return manifest
+
+    def _remove(self, video_id: str):
+        try:
+            os.remove(self._disk_path(video_id))
+        except OSError:
+            pass
+
+    def _store(self, manifest: VideoManifest):
+        if manifest.sabr:
+            # URL của luồng SABR gắn với phiên phân giải, lần sau phải phân giải lại
+            return
+        self._remember(manifest)
+        if not self.on_disk:
+            return
+        path = self._disk_path(manifest.video_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, url: str):
+        """Return the manifest for `url`, resolving it through pytubefix only on a miss."""
+        video_id = extract.video_id(url)
+        manifest = self._lookup(video_id)
+        if manifest is not None:
+            return manifest
+
+        # Mỗi video chỉ được phân giải bởi một luồng tại một thời điểm
+        with self._lock:
+            key_lock = self._resolving.setdefault(video_id, threading.Lock())
+        with key_lock:
+            manifest = self._lookup(video_id)
+            if manifest is None:
+                manifest = VideoManifest.from_youtube(YouTube(url=url))
+                self._store(manifest)
+        with self._lock:
+            self._resolving.pop(video_id, None)
+        return manifest
+
+    def invalidate(self, video_id: str):
+        """Drop a manifest, e.g. after its signed URLs were rejected."""
+        with self._lock:
+            self._entries.pop(video_id, None)
+        if self.on_disk:
+            self._remove(video_id)
@@ -0,0 +1,122 @@
+import os
+import shutil
+import threading
+import subprocess
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from ..utils.config import Configure
+
+
+def _run_ffmpeg(args: list, output_path: str):
+    """
+    Run ffmpeg, writing to a temporary file that is renamed into place only
+    on success.
+    """
+    root, ext = os.path.splitext(output_path)
+    tmp_path = f"{root}.tmp{ext}"
+    result = subprocess.run(args + [tmp_path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        message = result.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise RuntimeError(f"ffmpeg lỗi ({result.returncode}): {message[-1] if message else ''}")
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class MediaPipeline:
+    """
+    CPU-bound post-processing (muxing adaptive streams, audio transcoding)
+    by a local ffmpeg, with at most `workers` ffmpeg processes at once.
+
+    The work happens in the ffmpeg child processes; the pool threads only
+    wait on them. That avoids forking this multithreaded process, which a
+    process pool would do.
+
+    Jobs are submitted as soon as an item's streams are on disk and run while
+    the download workers move on to the next items; `wait` collects the
+    outcome at the end of a batch.
+    """
+
+    def __init__(self, configure: Configure):
+        self.configure = configure
+        self.ffmpeg = shutil.which("ffmpeg")
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = []
+
+    @property
+    def available(self):
+        return self.ffmpeg is not None
+
+    def _submit(self, args: list, output_path: str, inputs: list, label: str, on_done=None, group=None):
+        """
+        Queue one ffmpeg job. `on_done(output_path, error)` runs before the
+        returned future resolves, so `wait` also covers it. Jobs submitted
+        with a `group` can be waited for apart from other batches' jobs.
+        """
+        result = Future()
+
+        def finished(future):
+            error = future.exception()
+            try:
+                if error is None:
+                    # Xoá các tệp trung gian sau khi ghép/chuyển đổi thành công
+                    for path in inputs:
+                        if os.path.exists(path):
+                            os.remove(path)
+                if on_done:
+                    on_done(output_path, error)
+            except Exception as e:
+                error = error or e
+            if error is None:
+                result.set_result(output_path)
+            else:
+                result.set_exception(error)
+
+        with self._lock:
+            if self._executor is None:
+                workers = self.configure.media_pipeline.get("workers") or max(1, (os.cpu_count() or 2) // 2)
+                self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ffmpeg")
+            self._jobs = [job for job in self._jobs if not job[1].done()] + [(label, result, group)]
+            self._executor.submit(_run_ffmpeg, args, output_path).add_done_callback(finished)
+        return result
+
+    def mux(self, video_path: str, audio_path: str, output_path: str, label: str = None, on_done=None,
+            group=None):
+        """Combine an adaptive video stream and an audio stream without re-encoding."""
+        args = [
+            self.ffmpeg, "-y", "-loglevel", "error",
+            "-i", video_path, "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0", "-c", "copy",
+            "-movflags", "+faststart",
+        ]
+        return self._submit(args, output_path, [video_path, audio_path], label or output_path, on_done, group)
+
+    def transcode_audio(self, source_path: str, output_path: str, label: str = None, on_done=None,
+                        group=None):
+        """Convert an audio stream to a real MP3."""
+        args = [
+            self.ffmpeg, "-y", "-loglevel", "error",
+            "-i", source_path, "-vn",
+            "-c:a", "libmp3lame", "-b:a", self.configure.media_pipeline.get("audio_bitrate", "192k"),
+        ]
+        return self._submit(args, output_path, [source_path], label or output_path, on_done, group)
+
+    def wait(self, group=None):
+        """
+        Wait for every submitted job, or only those of `group`; returns
+        `(label, error)` pairs for the failures.
+        """
+        with self._lock:
+            jobs = [job for job in self._jobs if group is None or job[2] is group]
+            self._jobs = [job for job in self._jobs if not (group is None or job[2] is group)]
+        if jobs:
+            wait([future for _, future, _ in jobs])
+        return [(label, future.exception()) for label, future, _ in jobs if future.exception() is not None]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
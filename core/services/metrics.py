@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+from ..utils.config import Configure
+
+
+# Số giá trị tối đa mỗi sketch giữ lại, dù lô có bao nhiêu mục
+SKETCH_SIZE = 1024
+
+
+def _percentile(values, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class PercentileSketch:
+    """
+    A uniform sample of at most `size` values (reservoir sampling), so
+    percentiles of an arbitrarily long stream take constant memory. They are
+    exact until more than `size` values were added.
+    """
+
+    def __init__(self, size: int = SKETCH_SIZE):
+        self.size = size
+        self.count = 0
+        self.values = []
+
+    def add(self, value: float):
+        self.count += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            index = random.randrange(self.count)
+            if index < self.size:
+                self.values[index] = value
+
+    def percentile(self, q: float):
+        return _percentile(self.values, q)
+
+
+def _round(value, digits: int = 4):
+    return round(value, digits) if value is not None else None
+
+
+class ItemMetrics:
+    """Timings and sizes of one item, filled in as it moves through resolve, transfer and post-processing."""
+
+    def __init__(self, url: str, type_download: str):
+        self.url = url
+        self.type = type_download
+        self.video_id = None
+        self.itags = []
+        self.status = "pending"
+        self.stage = "resolve"
+        self.error = None
+        self.retries = 0
+        self.bytes = 0
+        self.path = None
+        self.on_finish = None
+
+        self.created_at = time.time()
+        self.resolve_time = None
+        self.transfer_started = None
+        self.first_byte_at = None
+        self.transfer_time = None
+        self.post_process_started = None
+        self.post_process_time = None
+        self.archive_time = None
+
+    def mark_resolved(self):
+        self.resolve_time = time.time() - self.created_at
+
+    def start_transfer(self):
+        self.stage = "transfer"
+        self.transfer_started = time.time()
+
+    def on_bytes(self, n: int):
+        if self.first_byte_at is None:
+            self.first_byte_at = time.time()
+        self.bytes += n
+
+    def end_transfer(self):
+        self.transfer_time = time.time() - self.transfer_started
+
+    def start_post_process(self):
+        self.stage = "post_process"
+        self.post_process_started = time.time()
+
+    def end_post_process(self):
+        self.post_process_time = time.time() - self.post_process_started
+
+    def finish(self, status: str, error: Exception = None):
+        self.status = status
+        self.error = error
+        if self.on_finish:
+            self.on_finish(self)
+
+    @property
+    def ttfb(self):
+        if self.first_byte_at is None or self.transfer_started is None:
+            return None
+        return self.first_byte_at - self.transfer_started
+
+    @property
+    def throughput(self):
+        """Bytes per second over the whole transfer, including time to first byte."""
+        return self.bytes / self.transfer_time if self.transfer_time else None
+
+    def to_dict(self):
+        return {
+            "event": "item",
+            "time": _round(time.time(), 3),
+            "url": self.url,
+            "video_id": self.video_id,
+            "type": self.type,
+            "itags": self.itags,
+            "status": self.status,
+            "stage": self.stage,
+            "error": str(self.error) if self.error else None,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "resolve_s": _round(self.resolve_time),
+            "ttfb_s": _round(self.ttfb),
+            "transfer_s": _round(self.transfer_time),
+            "throughput_bps": _round(self.throughput, 1),
+            "post_process_s": _round(self.post_process_time),
+            "archive_s": _round(self.archive_time),
+        }
+
+
+class BatchMetrics:
+    """
+    The items of one batch, aggregated as each item reaches its final status,
+    at which point `on_finish(item)` is called. Only running totals and
+    bounded percentile sketches are kept, so memory does not grow with the
+    batch.
+    """
+
+    def __init__(self, desc: str = "", on_finish=None):
+        self.desc = desc
+        self.on_finish = on_finish
+        self.started_at = time.time()
+        self.finished_at = None
+        self.items = 0
+        self.counts = {"succeeded": 0, "skipped": 0, "failed": 0}
+        self.bytes = 0
+        self.retries = 0
+        self.post_process_time = 0.0
+        self.archive_time = 0.0
+        self.resolves = PercentileSketch()
+        self.ttfbs = PercentileSketch()
+        self.throughputs = PercentileSketch()
+        self._lock = threading.Lock()
+
+    def new_item(self, url: str, type_download: str):
+        item = ItemMetrics(url, type_download)
+        item.on_finish = self._finished
+        with self._lock:
+            self.items += 1
+        return item
+
+    def _finished(self, item: ItemMetrics):
+        with self._lock:
+            if item.status in self.counts:
+                self.counts[item.status] += 1
+            self.bytes += item.bytes
+            self.retries += item.retries
+            self.post_process_time += item.post_process_time or 0
+            self.archive_time += item.archive_time or 0
+            if item.resolve_time is not None:
+                self.resolves.add(item.resolve_time)
+            if item.ttfb is not None:
+                self.ttfbs.add(item.ttfb)
+            if item.throughput:
+                self.throughputs.add(item.throughput)
+        if self.on_finish:
+            self.on_finish(item)
+
+    def summary(self):
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        with self._lock:
+            return {
+                "event": "batch",
+                "time": _round(time.time(), 3),
+                "desc": self.desc,
+                "items": self.items,
+                **self.counts,
+                "bytes": self.bytes,
+                "retries": self.retries,
+                "elapsed_s": _round(elapsed),
+                "throughput_bps": _round(self.bytes / elapsed, 1) if elapsed else None,
+                "resolve_p50_s": _round(self.resolves.percentile(0.5)),
+                "resolve_p95_s": _round(self.resolves.percentile(0.95)),
+                "ttfb_p50_s": _round(self.ttfbs.percentile(0.5)),
+                "ttfb_p95_s": _round(self.ttfbs.percentile(0.95)),
+                "item_throughput_p50_bps": _round(self.throughputs.percentile(0.5), 1),
+                "post_process_s": _round(self.post_process_time),
+                "archive_s": _round(self.archive_time),
+            }
+
+
+class MetricsRecorder:
+    """
+    Writes item and batch metrics as JSON lines to `project_root/metrics.jsonl`
+    and, when enabled, a Prometheus textfile (`project_root/metrics.prom`)
+    for node_exporter's textfile collector.
+    """
+
+    def __init__(self, configure: Configure):
+        self.configure = configure
+        self.log_path = os.path.join(configure.project_root, "metrics.jsonl")
+        self.prometheus_path = os.path.join(configure.project_root, "metrics.prom")
+        self._lock = threading.Lock()
+        self._totals = {"succeeded": 0, "skipped": 0, "failed": 0, "bytes": 0, "retries": 0, "batches": 0}
+
+    def batch(self, desc: str = "", on_finish=None):
+        return BatchMetrics(desc, on_finish)
+
+    def _append(self, record: dict):
+        if not self.configure.metrics['jsonl']:
+            return
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def record(self, item: ItemMetrics):
+        """Log a finished (succeeded, skipped or failed) item."""
+        with self._lock:
+            if item.status in self._totals:
+                self._totals[item.status] += 1
+            self._totals["bytes"] += item.bytes
+            self._totals["retries"] += item.retries
+        self._append(item.to_dict())
+
+    @contextmanager
+    def track(self, item: ItemMetrics):
+        """Record `item` as failed at its current stage if the block raises."""
+        try:
+            yield item
+        except Exception as e:
+            item.finish("failed", e)
+            self.record(item)
+            raise
+
+    def finish_batch(self, batch: BatchMetrics):
+        batch.finished_at = time.time()
+        summary = batch.summary()
+        with self._lock:
+            self._totals["batches"] += 1
+        self._append(summary)
+        if self.configure.metrics['prometheus']:
+            self._write_prometheus(summary)
+        return summary
+
+    def _write_prometheus(self, summary: dict):
+        with self._lock:
+            totals = dict(self._totals)
+        lines = [
+            "# HELP ytdl_items_total Items processed by this process, by status.",
+            "# TYPE ytdl_items_total counter",
+        ]
+        lines += [f'ytdl_items_total{{status="{status}"}} {totals[status]}'
+                  for status in ("succeeded", "skipped", "failed")]
+        lines += [
+            "# HELP ytdl_bytes_total Bytes downloaded by this process.",
+            "# TYPE ytdl_bytes_total counter",
+            f"ytdl_bytes_total {totals['bytes']}",
+            "# HELP ytdl_retries_total Transfer retries by this process.",
+            "# TYPE ytdl_retries_total counter",
+            f"ytdl_retries_total {totals['retries']}",
+            "# HELP ytdl_batches_total Batches finished by this process.",
+            "# TYPE ytdl_batches_total counter",
+            f"ytdl_batches_total {totals['batches']}",
+        ]
+        gauges = [
+            ("last_batch_duration_seconds", "Wall-clock time of the last batch.", summary["elapsed_s"]),
+            ("last_batch_throughput_bytes_per_second", "Bytes per second over the last batch.", summary["throughput_bps"]),
+            ("last_batch_resolve_p95_seconds", "95th percentile metadata resolve latency in the last batch.", summary["resolve_p95_s"]),
+            ("last_batch_ttfb_p95_seconds", "95th percentile time to first byte in the last batch.", summary["ttfb_p95_s"]),
+            ("last_batch_post_process_seconds", "Total ffmpeg time (including queueing) in the last batch.", summary["post_process_s"]),
+            ("last_batch_timestamp_seconds", "Unix time the last batch finished.", summary["time"]),
+        ]
+        for name, help_text, value in gauges:
+            lines += [
+                f"# HELP ytdl_{name} {help_text}",
+                f"# TYPE ytdl_{name} gauge",
+                f"ytdl_{name} {value if value is not None else 'NaN'}",
+            ]
+        # Ghi vào tệp tạm rồi đổi tên để collector không đọc phải tệp dở dang
+        tmp_path = self.prometheus_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
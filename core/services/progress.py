@@ -0,0 +1,216 @@
+import sys
+import time
+import threading
+from collections import deque
+
+from tqdm import tqdm
+
+# Độ rộng tối đa của nhãn mỗi thanh tiến trình của một mục
+LABEL_WIDTH = 32
+
+
+class ProgressTask:
+    """
+    Byte counter of one transfer, drawn as its own bar by a `ProgressRenderer`.
+
+    `update` only appends to a deque, which is atomic in CPython, so transfer
+    threads never take a lock or touch the terminal per chunk; the renderer
+    folds the counts into `n` on its own thread.
+    """
+
+    def __init__(self, renderer, label: str, total: int = 0):
+        self.renderer = renderer
+        self.label = label
+        self.total = total
+        self.n = 0
+        self.closed = False
+        self._pending = deque()
+        self._drain_lock = threading.Lock()
+
+    def update(self, n: int):
+        if n:
+            self._pending.append(n)
+
+    def rewind(self, n: int):
+        """Take back `n` bytes reported by an attempt that is about to be retried."""
+        if n > 0:
+            self._pending.append(-n)
+
+    def write(self, message: str):
+        self.renderer.write(message)
+
+    def drain(self):
+        """Fold the pending counts into `n` and return how many bytes that added."""
+        added = 0
+        with self._drain_lock:
+            pending = self._pending
+            while pending:
+                added += pending.popleft()
+            self.n += added
+        return added
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _SilentTask(ProgressTask):
+    """Task of a disabled renderer: nothing is drawn, so nothing is counted."""
+
+    def update(self, n: int):
+        pass
+
+    def rewind(self, n: int):
+        pass
+
+
+class ProgressRenderer:
+    """
+    Aggregate bar plus one bar per running transfer, drawn by a render thread
+    `refresh_rate` times per second.
+
+    Transfers report through `task(label, total)` (or `update` for bytes that
+    belong to no task). All tqdm calls and messages passed to `write` happen
+    on the render thread, so the transfer path costs one deque append per
+    chunk however many downloads run at once. At most `max_bars` item bars
+    are shown; the aggregate bar counts every byte and shows the rate and ETA.
+
+    `on_tick(snapshot)` is called after every render with the counts as a
+    dict (see `snapshot`); with it, bytes are counted even when drawing is
+    disabled.
+    """
+
+    def __init__(self, total: int = 0, desc: str = "", disable: bool = False, refresh_rate: float = 10,
+                 max_bars: int = 8, on_tick=None, **kwargs):
+        self.disable = disable
+        self.on_tick = on_tick
+        self.n = 0
+        self.rate = None
+        self.interval = 1.0 / max(refresh_rate, 1)
+        self.max_bars = max(0, int(max_bars))
+        self._lock = threading.Lock()
+        self._total = total
+        self._tasks = []
+        self._bars = {}
+        self._messages = deque()
+        counting = not disable or on_tick is not None
+        self._task_class = ProgressTask if counting else _SilentTask
+        self._loose = self._task_class(self, desc)
+        self._stop = threading.Event()
+        self._closed = False
+        self.bar = tqdm(total=total, unit='B', unit_scale=True, desc=desc, disable=disable,
+                        mininterval=0, **kwargs)
+        self._thread = None
+        self._last_tick = time.monotonic()
+        if counting:
+            self._thread = threading.Thread(target=self._run, name="progress-render", daemon=True)
+            self._thread.start()
+
+    def add_total(self, n: int):
+        with self._lock:
+            self._total += n
+
+    def task(self, label: str, total: int = 0):
+        """Start counting one transfer; close the task (or leave its `with` block) when it ends."""
+        task = self._task_class(self, label, total)
+        with self._lock:
+            self._tasks.append(task)
+        return task
+
+    def update(self, n: int):
+        self._loose.update(n)
+
+    def rewind(self, n: int):
+        self._loose.rewind(n)
+
+    def write(self, message: str):
+        # Cùng luồng stderr với thanh tiến trình, để stdout chỉ chứa kết quả (ví dụ --json)
+        if self._thread is None or self._closed:
+            print(message, file=sys.stderr)
+        else:
+            self._messages.append(message)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._render()
+
+    def _render(self):
+        with self._lock:
+            tasks = list(self._tasks)
+            total = self._total
+        # Đọc closed trước khi lấy số đếm: byte thêm vào ngay trước close() vẫn được tính
+        finished = {task for task in tasks if task.closed}
+        added = self._loose.drain()
+        for task in tasks:
+            added += task.drain()
+
+        while self._messages:
+            self.bar.write(self._messages.popleft(), file=sys.stderr)
+
+        for task in tasks:
+            bar = self._bars.get(task)
+            if task in finished:
+                if bar is not None:
+                    bar.close()
+                    del self._bars[task]
+            elif bar is not None:
+                bar.total = task.total
+                bar.update(task.n - bar.n)
+            elif len(self._bars) < self.max_bars and not self.disable:
+                label = str(task.label or "")
+                label = label if len(task.label) <= LABEL_WIDTH else task.label[:LABEL_WIDTH - 1] + "…"
+                self._bars[task] = tqdm(total=task.total, initial=task.n, unit='B', unit_scale=True,
+                                        desc=f"  {label}", leave=False, mininterval=0)
+        if finished:
+            with self._lock:
+                self._tasks = [task for task in self._tasks if task not in finished]
+
+        self.bar.total = total
+        self.bar.update(added)
+
+        # Tốc độ trung bình trượt, cùng hệ số làm mượt mặc định của tqdm
+        now = time.monotonic()
+        elapsed, self._last_tick = now - self._last_tick, now
+        self.n += added
+        if elapsed > 0:
+            rate = added / elapsed
+            self.rate = rate if self.rate is None else 0.3 * rate + 0.7 * self.rate
+        if self.on_tick:
+            self.on_tick(self.snapshot(total, [task for task in tasks if task not in finished]))
+
+    def snapshot(self, total: int = None, tasks=None):
+        """Bytes done, total, rate (bytes/s), ETA (s) and the running tasks' counts."""
+        total = self._total if total is None else total
+        tasks = self._tasks if tasks is None else tasks
+        eta = (total - self.n) / self.rate if self.rate and total > self.n else None
+        return {
+            "bytes": self.n,
+            "total": total,
+            "rate": round(self.rate, 1) if self.rate is not None else None,
+            "eta": round(eta, 1) if eta is not None else None,
+            "items": [{"label": task.label, "bytes": task.n, "total": task.total} for task in tasks],
+        }
+
+    def close(self):
+        if self._closed:
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        # Từ đây write() in thẳng ra stderr; lần vẽ cuối lấy nốt các thông báo còn đợi
+        self._closed = True
+        for task in list(self._tasks):
+            task.close()
+        self._render()
+        self.bar.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
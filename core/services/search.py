@@ -0,0 +1,149 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pytubefix import Search
+from pytubefix.contrib.search import Filter
+
+from .governor import Governor
+from ..utils.config import Configure
+
+# Chuyển tên bộ lọc trong config.json (ví dụ 'Today') sang tham số protobuf của pytubefix
+FILTER_TRANSLATORS = {
+    'upload_date': Filter.get_upload_date,
+    'type': Filter.get_type,
+    'duration': Filter.get_duration,
+    'features': Filter.get_features,
+    'sort_by': Filter.get_sort_by,
+}
+
+
+class SearchResults:
+    """
+    Result pages of one search, loaded lazily with `get_next_results`.
+
+    A page only yields video IDs: in pytubefix even a result's title comes
+    from the player response, one request per video. Batches therefore take
+    only the IDs and get titles from the resolved manifests. The interactive
+    listing needs title, author, views and length; `warm` fetches them
+    concurrently, under the governor's request limit, for the results about
+    to be printed.
+    """
+
+    def __init__(self, search: Search, workers: int = 8, governor: Governor = None):
+        self.search = search
+        self.workers = max(1, int(workers))
+        self.governor = governor
+        self.created_at = time.time()
+        self.videos = []
+        self._warmed = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def warm(self, count: int = None):
+        """Fetch the player info of the first `count` videos (all loaded ones by default) not fetched yet."""
+        with self._lock:
+            count = len(self.videos) if count is None else min(count, len(self.videos))
+            videos = self.videos[self._warmed:count]
+            self._warmed = max(self._warmed, count)
+
+        def touch(yt):
+            try:
+                if self.governor:
+                    self.governor.call(lambda: yt.vid_info)
+                else:
+                    yt.vid_info
+            except Exception:
+                pass
+
+        if videos:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(videos))) as executor:
+                list(executor.map(touch, videos))
+
+    @property
+    def has_more(self):
+        return not self._loaded or self.search._current_continuation is not None
+
+    def load_more(self):
+        """Fetch the next page (the first one on the first call); returns the new videos."""
+        with self._lock:
+            if not self.has_more:
+                return []
+            if not self._loaded:
+                new_videos = self.search.videos
+                self._loaded = True
+            else:
+                loaded = len(self.search.videos)
+                self.search.get_next_results()
+                new_videos = self.search.videos[loaded:]
+            self.videos.extend(new_videos)
+            return new_videos
+
+    def ensure(self, count: int):
+        """Load pages until at least `count` videos are available or results run out."""
+        while len(self.videos) < count and self.has_more:
+            if not self.load_more():
+                break
+        return self.videos[:count]
+
+
+class SearchCache:
+    """
+    Searches cached per (query, filters) with TTL and LRU eviction.
+
+    When `filter_options['enabled']` is set, the configured filters are sent
+    with the query, so YouTube does the filtering; a cached search keeps every
+    page loaded so far.
+    """
+
+    def __init__(self, configure: Configure, governor: Governor = None):
+        self.configure = configure
+        self.governor = governor
+        options = configure.search_cache
+        self.capacity = max(1, int(options.get("capacity", 32)))
+        self.ttl = float(options.get("ttl", 15 * 60))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _filters(self):
+        """The enabled `filter_options` as `Search(filters=...)` expects them; unknown values are skipped."""
+        options = self.configure.filter_options or {}
+        if not options.get('enabled'):
+            return None
+        filters = {}
+        for category, translate in FILTER_TRANSLATORS.items():
+            value = options.get(category)
+            if category == 'features':
+                values = value if isinstance(value, (list, tuple)) else [value]
+                features = [translate(item) for item in values if item]
+                features = [feature for feature in features if feature]
+                if features:
+                    filters['features'] = features
+            elif value:
+                translated = translate(value)
+                if translated:
+                    filters[category] = translated
+        return filters or None
+
+    def search(self, query: str):
+        """Return cached results for `query`, loading the first page on a miss."""
+        query = query.strip()
+        filters = self._filters()
+        key = (query, json.dumps(filters, sort_keys=True, ensure_ascii=False))
+        with self._lock:
+            results = self._entries.get(key)
+            if results is not None and time.time() - results.created_at <= self.ttl:
+                self._entries.move_to_end(key)
+                return results
+            self._entries.pop(key, None)
+
+        results = SearchResults(Search(query=query, filters=filters), workers=self.configure.preflight_workers,
+                                governor=self.governor)
+        results.load_more()
+        with self._lock:
+            self._entries[key] = results
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return results
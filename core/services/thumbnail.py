@@ -0,0 +1,97 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import wait
+from urllib.parse import urlparse
+
+from .engine import AsyncTransferEngine
+from ..utils.config import Configure
+
+
+class ThumbnailFetcher:
+    """
+    Background thumbnail stage, one image per video ID in `thumbnail_folder`.
+
+    Thumbnails already on disk or being fetched are skipped; a failed fetch
+    may be queued again later. Fetches run on the transfer engine's pooled
+    session behind a small semaphore, so they overlap with media downloads
+    without competing with them.
+    """
+
+    def __init__(self, configure: Configure, engine: AsyncTransferEngine, max_concurrent: int = 2):
+        self.configure = configure
+        self.engine = engine
+        self.max_concurrent = max_concurrent
+        self._lock = threading.Lock()
+        self._queued = set()
+        self._futures = []
+        self._semaphore = None
+
+    @staticmethod
+    def _candidates(video_id: str, thumbnail_url: str = None):
+        urls = [thumbnail_url] if thumbnail_url else []
+        urls.append(f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg")
+        urls.append(f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg")
+        return urls
+
+    def _existing(self, video_id: str):
+        for ext in ("jpg", "webp", "png"):
+            path = os.path.join(self.configure.thumbnail_folder, f"{video_id}.{ext}")
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def _save(self, video_id: str, url: str, data: bytes):
+        ext = os.path.splitext(urlparse(url).path)[1].lstrip(".") or "jpg"
+        path = os.path.join(self.configure.thumbnail_folder, f"{video_id}.{ext}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return path
+
+    async def _fetch_async(self, video_id: str, urls: list):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        try:
+            async with self._semaphore:
+                error = None
+                for url in urls:
+                    try:
+                        data = await self.engine.get_bytes(url)
+                        return await asyncio.to_thread(self._save, video_id, url, data)
+                    except Exception as e:
+                        error = e
+                raise error
+        finally:
+            # Xong (thành công hay lỗi) thì bỏ khỏi tập đang tải: tệp trên đĩa đã đủ để bỏ qua lần sau
+            with self._lock:
+                self._queued.discard(video_id)
+
+    def fetch(self, video_id: str, thumbnail_url: str = None, group=None):
+        """
+        Queue the best thumbnail for `video_id`; returns a future, or None if
+        skipped. `group` lets `wait` cover only one batch's thumbnails.
+        """
+        with self._lock:
+            if video_id in self._queued or self._existing(video_id):
+                return None
+            self._queued.add(video_id)
+        os.makedirs(self.configure.thumbnail_folder, exist_ok=True)
+        urls = self._candidates(video_id, thumbnail_url)
+        future = self.engine.run(self._fetch_async(video_id, urls))
+        with self._lock:
+            self._futures = [entry for entry in self._futures if not entry[0].done()] + [(future, group)]
+        return future
+
+    def wait(self, timeout: float = 60, group=None):
+        """Wait for queued thumbnails (of `group`, if given); returns the number that failed."""
+        with self._lock:
+            futures = [future for future, owner in self._futures if group is None or owner is group]
+            self._futures = [entry for entry in self._futures if not (group is None or entry[1] is group)]
+        if not futures:
+            return 0
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+        return sum(1 for future in done if future.exception() is not None) + len(not_done)
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+
+# Giống pytubefix: YouTube giới hạn tốc độ với các range lớn hơn ~10MB
+DEFAULT_CHUNK_SIZE = 9 * 1024 * 1024
+READ_SIZE = 64 * 1024
+MIN_PIECE_SIZE = 1024 * 1024
+# Ghi journal (kèm một lần fsync) sau mỗi chừng này byte, tức vài lần ghi của engine,
+# hoặc sau chừng này giây với kết nối chậm; khi dừng hay lỗi, journal luôn được ghi
+JOURNAL_INTERVAL = 8 * 1024 * 1024
+JOURNAL_SECONDS = 2.0
+
+
+class TransferError(IOError):
+    """
+    Raised when a transfer cannot be completed or verified.
+
+    `status` is the HTTP status that caused it, if any, and `retry_after`
+    the server's `Retry-After` in seconds.
+    """
+
+    def __init__(self, message: str, status: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TransferCancelled(Exception):
+    """Raised in a transfer whose batch was cancelled (Ctrl+C); its `.part` file and journal are kept."""
+
+
+def parse_retry_after(value):
+    """Seconds from a `Retry-After` header in its delta-seconds form, else None."""
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class PartialJournal:
+    """
+    Completed byte ranges of a `.part` file, persisted as JSON next to it.
+
+    Ranges are half-open `[start, end)` and kept sorted and merged.
+    """
+
+    def __init__(self, path: str, total: int):
+        self.path = path
+        self.total = total
+        self.ranges = []
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("total") == self.total:
+                self.ranges = [[int(start), int(end)] for start, end in data.get("ranges", [])]
+        except (OSError, ValueError, TypeError):
+            self.ranges = []
+        return self
+
+    def reset(self):
+        with self._lock:
+            self.ranges = []
+        self.save()
+
+    def add(self, start: int, end: int):
+        """
+        Mark `[start, end)` as written; call it only once the bytes were
+        handed to the OS (`os.pwrite` returned).
+
+        Returns True once `JOURNAL_INTERVAL` bytes are unsaved, or some are
+        and the last save is `JOURNAL_SECONDS` old, so a crash loses at most
+        that much progress without an fsync after every write.
+        """
+        with self._lock:
+            merged = []
+            for r_start, r_end in sorted(self.ranges + [[start, end]]):
+                if merged and r_start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], r_end)
+                else:
+                    merged.append([r_start, r_end])
+            self.ranges = merged
+            self._unsaved += end - start
+            return (self._unsaved >= JOURNAL_INTERVAL
+                    or time.monotonic() - self._saved_at >= JOURNAL_SECONDS)
+
+    def save(self, fd: int = None):
+        """Write the journal; with the `.part` file's `fd`, its data is fsynced first."""
+        if fd is not None:
+            # Journal chỉ được liệt kê những byte đã thực sự nằm trên đĩa
+            os.fsync(fd)
+        with self._lock:
+            data = {"total": self.total, "ranges": [list(r) for r in self.ranges]}
+            self._unsaved = 0
+            self._saved_at = time.monotonic()
+            tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def completed(self):
+        with self._lock:
+            return sum(end - start for start, end in self.ranges)
+
+    def missing(self):
+        """Return the byte ranges that still have to be fetched."""
+        with self._lock:
+            gaps = []
+            position = 0
+            for start, end in self.ranges:
+                if start > position:
+                    gaps.append((position, start))
+                position = max(position, end)
+            if position < self.total:
+                gaps.append((position, self.total))
+            return gaps
+
+
+def open_part(file_path: str, filesize: int):
+    """Return `(part_path, journal)` for `file_path`, reusing an interrupted `.part` file."""
+    part_path = f"{file_path}.part"
+    journal = PartialJournal(f"{part_path}.json", filesize)
+    if os.path.exists(part_path):
+        journal.load()
+    else:
+        with open(part_path, "wb"):
+            pass
+        journal.reset()
+    return part_path, journal
+
+
+def open_part_fd(part_path: str):
+    """
+    Open a `.part` file for positional writes. `os.pwrite` on the returned
+    descriptor is unbuffered, so bytes are in the file as soon as it returns,
+    whichever connection wrote them.
+    """
+    return os.open(part_path, os.O_RDWR | getattr(os, "O_BINARY", 0))
+
+
+def finalize_part(file_path: str, part_path: str, journal: PartialJournal, filesize: int):
+    """
+    Verify the `.part` file against `filesize` and atomically move it into place.
+
+    The file may be preallocated (sparse), so its size alone proves nothing;
+    the journal must cover every byte as well.
+    """
+    fd = open_part_fd(part_path)
+    try:
+        journal.save(fd)
+        size = os.fstat(fd).st_size
+    finally:
+        os.close(fd)
+    completed = journal.completed
+    if completed != filesize or size != filesize:
+        raise TransferError(f"Kích thước không khớp: {size} byte trên đĩa, {completed}/{filesize} byte đã tải")
+    os.replace(part_path, file_path)
+    journal.remove()
+    return file_path
+
+
+def split_pieces(journal: PartialJournal, chunk_size: int, connections: int = 1):
+    """
+    Split the missing ranges into pieces of at most `chunk_size`, small enough
+    to spread evenly over `connections`.
+    """
+    gaps = journal.missing()
+    if connections > 1:
+        remaining = sum(end - start for start, end in gaps)
+        chunk_size = max(MIN_PIECE_SIZE, min(chunk_size, -(-remaining // connections)))
+    pieces = []
+    for gap_start, gap_end in gaps:
+        for start in range(gap_start, gap_end, chunk_size):
+            pieces.append((start, min(start + chunk_size, gap_end)))
+    return pieces
+
@@ -0,0 +1,172 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from .batch import WorkerBudget
+from .governor import classify, THROTTLED
+from ..utils.config import Configure
+
+# Số cửa sổ giữ nguyên giới hạn sau khi giảm, để thông lượng kịp ổn định
+HOLD_WINDOWS = 3
+
+
+class ConcurrencyTuner:
+    """
+    AIMD controller for the worker budget's limit (items downloading at once).
+
+    While a batch runs, throughput and retries are measured over windows of
+    `interval` seconds, and the limit moves within `[min_workers, max_workers]`:
+
+    - a 429, or `error_threshold` retries in one window, halves the limit;
+    - otherwise the limit grows by one when every slot was busy;
+    - an increase that did not raise throughput by `min_gain` is taken back,
+      since the link (or disk) is already saturated.
+
+    After a decrease the limit holds for a few windows. When the last batch
+    ends, the limit with the best throughput is saved to
+    `configure.auto_tune` as `tuned_workers`, and the next run starts there.
+    """
+
+    def __init__(self, configure: Configure, budget: WorkerBudget):
+        self.configure = configure
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._bytes = deque()
+        self._retries = 0
+        self._throttled = 0
+        self._sessions = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._probe = None
+        self._hold = 0
+        self.best = None
+        self.history = []
+
+    @property
+    def enabled(self):
+        return bool(self.configure.auto_tune['enabled'])
+
+    def bounds(self):
+        options = self.configure.auto_tune
+        low = max(1, int(options['min_workers']))
+        return low, max(low, int(options['max_workers']))
+
+    def initial_limit(self):
+        """Where a run starts: the last tuned value if there is one, else `max_workers`, within bounds."""
+        low, high = self.bounds()
+        start = self.configure.auto_tune['tuned_workers'] or self.configure.max_workers
+        return min(high, max(low, int(start)))
+
+    def add_bytes(self, n: int):
+        # Gọi trên luồng tải cho mỗi khối: chỉ một thao tác append, không khoá
+        self._bytes.append(n)
+
+    def on_retry(self, error: Exception):
+        with self._lock:
+            self._retries += 1
+            if classify(error) == THROTTLED:
+                self._throttled += 1
+
+    @contextmanager
+    def session(self):
+        """Tune while the block runs; nested or concurrent sessions (daemon batches) share one loop."""
+        if not self.enabled:
+            yield self
+            return
+        with self._lock:
+            self._sessions += 1
+            if self._thread is None:
+                self._stop.clear()
+                # Bỏ số liệu còn sót từ các lần tải ngoài phiên
+                self._bytes.clear()
+                self._retries = self._throttled = 0
+                self.best = None
+                self._probe = None
+                self._hold = 0
+                self._thread = threading.Thread(target=self._run, name="concurrency-tuner", daemon=True)
+                self._thread.start()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._sessions -= 1
+                thread = self._thread if self._sessions == 0 else None
+                if thread is not None:
+                    self._thread = None
+                    self._stop.set()
+            if thread is not None:
+                thread.join()
+                self._save()
+
+    def _run(self):
+        self.budget.take_peak()
+        started = time.monotonic()
+        while not self._stop.wait(float(self.configure.auto_tune['interval'])):
+            now = time.monotonic()
+            self.step(now - started)
+            started = now
+
+    def step(self, elapsed: float):
+        """Close one measurement window of `elapsed` seconds and set the next limit."""
+        received = 0
+        while self._bytes:
+            received += self._bytes.popleft()
+        with self._lock:
+            retries, self._retries = self._retries, 0
+            throttled, self._throttled = self._throttled, 0
+        peak = self.budget.take_peak()
+        throughput = received / elapsed if elapsed > 0 else 0.0
+        limit = self.budget.limit
+        low, high = self.bounds()
+        options = self.configure.auto_tune
+
+        if received and peak >= limit and retries < options['error_threshold'] and not throttled:
+            if self.best is None or throughput > self.best[1]:
+                self.best = (limit, throughput)
+
+        new_limit = limit
+        if throttled or retries >= options['error_threshold']:
+            # Giảm theo cấp số nhân khi backend chặn hoặc lỗi dồn dập
+            new_limit = max(low, limit // 2)
+            self._probe = None
+            self._hold = HOLD_WINDOWS
+        elif self._probe is not None and throughput < self._probe[1] * (1 + options['min_gain']):
+            # Thêm luồng không làm tăng thông lượng: đường truyền đã bão hoà, lùi lại
+            new_limit = max(low, self._probe[0])
+            self._probe = None
+            self._hold = HOLD_WINDOWS
+        elif self._hold > 0:
+            self._hold -= 1
+        elif peak >= limit and limit < high:
+            # Tăng từng bước khi mọi slot đều bận
+            self._probe = (limit, throughput)
+            new_limit = limit + 1
+        else:
+            self._probe = None
+
+        new_limit = min(high, max(low, new_limit))
+        self.history.append({
+            "time": round(time.time(), 3),
+            "limit": limit,
+            "peak": peak,
+            "throughput_bps": round(throughput, 1),
+            "retries": retries,
+            "throttled": throttled,
+            "next_limit": new_limit,
+        })
+        del self.history[:-100]
+        if new_limit != limit:
+            self.budget.set_limit(new_limit)
+        return new_limit
+
+    def _save(self):
+        if self.best is None:
+            return
+        limit, throughput = self.best
+        self.configure.auto_tune.update(
+            tuned_workers=limit,
+            tuned_throughput=round(throughput, 1),
+            tuned_at=round(time.time(), 3),
+        )
+        self.configure.save_config(quiet=True)
@@ -1,9 +1,25 @@
 import os
+import sys
 import json
+import threading
 from dotenv import load_dotenv
 from ..header import Header
 
+_shared = None
+_shared_lock = threading.Lock()
+_dotenv_loaded = False
+
+
 class Configure():
+    @classmethod
+    def shared(cls):
+        """The process-wide instance used by the screens and services."""
+        global _shared
+        with _shared_lock:
+            if _shared is None:
+                _shared = cls()
+            return _shared
+
     def __init__(self):
         self.project_root = "youtube_downloader_projects"
         self.audio_folder = os.path.join(self.project_root, "audio")
@@ -11,8 +27,12 @@ class Configure():
         self.thumbnail_folder = os.path.join(self.project_root, "thumbnail")
         self.config_file = os.path.join(self.project_root, "config.json")
         self.max_workers = 4
+        self.preflight_workers = 8
+        self.download_thumbnails = False
 
+        # Bộ lọc tìm kiếm gửi kèm từ khoá; chỉ áp dụng khi bật 'enabled'
         self.filter_options = {
+            'enabled': False,
             'upload_date': 'Today',
             'type': 'Video',
             'duration': 'Under 4 minutes',
@@ -20,57 +40,202 @@ class Configure():
             'sort_by': 'Upload date'
         }
 
-        load_dotenv()
+        self.manifest_cache = {
+            'capacity': 256,
+            'ttl': 6 * 3600,
+            'on_disk': True
+        }
+
+        self.search_cache = {
+            'capacity': 32,
+            'ttl': 15 * 60
+        }
+
+        self.segmented_download = {
+            'enabled': False,
+            'connections': 4,
+            'min_size': 32 * 1024 * 1024
+        }
+
+        # Ghép luồng adaptive và chuyển đổi audio bằng ffmpeg (nếu có)
+        self.media_pipeline = {
+            'adaptive_video': True,
+            'transcode_audio': True,
+            'audio_bitrate': '192k',
+            'workers': 0
+        }
+
+        # Thử lại khi lỗi, giới hạn số yêu cầu/giây và băng thông tổng tính bằng byte/giây (0 = không giới hạn)
+        self.governor = {
+            'max_retries': 5,
+            'backoff_base': 1.0,
+            'backoff_max': 60.0,
+            'requests_per_second': 10,
+            'request_burst': 20,
+            'max_bandwidth': 0
+        }
+
+        # Số liệu hiệu năng: metrics.jsonl và (tuỳ chọn) metrics.prom trong project_root
+        self.metrics = {
+            'jsonl': True,
+            'prometheus': False
+        }
+
+        # Tự điều chỉnh số mục tải cùng lúc (AIMD) trong khoảng [min_workers, max_workers];
+        # tuned_* là giá trị tốt nhất đo được ở lần chạy trước, dùng làm điểm xuất phát
+        self.auto_tune = {
+            'enabled': False,
+            'min_workers': 1,
+            'max_workers': 16,
+            'interval': 5.0,
+            'error_threshold': 3,
+            'min_gain': 0.05,
+            'tuned_workers': None,
+            'tuned_throughput': None,
+            'tuned_at': None
+        }
+
+        # Chế độ daemon: API HTTP cục bộ để gửi và theo dõi các lô tải
+        self.daemon = {
+            'host': '127.0.0.1',
+            'port': 8765,
+            # Số lô chạy cùng lúc; các lô gửi thêm xếp hàng chờ
+            'max_batches': 2
+        }
+
+        self._listeners = []
+        self._loaded_mtime = None
+        self._saved = {}
+
+        # .env chỉ cần đọc một lần cho cả tiến trình
+        global _dotenv_loaded
+        if not _dotenv_loaded:
+            load_dotenv()
+            _dotenv_loaded = True
 
-        os.makedirs(self.audio_folder, exist_ok=True)
-        os.makedirs(self.video_folder, exist_ok=True)
-        os.makedirs(self.thumbnail_folder, exist_ok=True)
-        
         # Tải cấu hình nếu có
         self.load_config()
+        self._make_folders()
+        self._saved = self._snapshot()
 
         self.header = Header()
 
+    def _make_folders(self):
+        for folder in (self.audio_folder, self.video_folder, self.thumbnail_folder):
+            os.makedirs(folder, exist_ok=True)
+
+    def _config_mtime(self):
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _snapshot(self):
+        # Bản sao sâu, vì các dict cấu hình bị sửa tại chỗ
+        return json.loads(json.dumps(self.to_dict()))
+
+    def subscribe(self, listener):
+        """Call `listener(configure, changed)` with the changed top-level keys after every save or reload."""
+        self._listeners.append(listener)
+
+    def _notify(self):
+        before, self._saved = self._saved, self._snapshot()
+        changed = {key for key, value in self._saved.items() if before.get(key) != value}
+        if changed:
+            for listener in list(self._listeners):
+                listener(self, changed)
+        return changed
+
+    def reload_if_changed(self):
+        """
+        Re-read config.json if it changed on disk since this instance last
+        read or wrote it, e.g. edited by hand or by another process. Returns
+        the changed keys; costs one stat() when nothing changed.
+        """
+        if self._config_mtime() == self._loaded_mtime:
+            return set()
+        self.load_config()
+        self._make_folders()
+        return self._notify()
+
     def _max_workers(self):
         return self.max_workers
     
     def load_config(self):
         try:
-            if os.path.exists(self.config_file):
+            self._loaded_mtime = self._config_mtime()
+            if self._loaded_mtime is not None:
                 with open(self.config_file, "r") as f:
                     config = json.load(f)
                     if "max_workers" in config:
                         self.max_workers = config["max_workers"]
+                    if "preflight_workers" in config:
+                        self.preflight_workers = config["preflight_workers"]
+                    if "download_thumbnails" in config:
+                        self.download_thumbnails = config["download_thumbnails"]
                     if "folders" in config:
                         self.audio_folder = config["folders"].get("audio", self.audio_folder)
                         self.video_folder = config["folders"].get("video", self.video_folder)
                         self.thumbnail_folder = config["folders"].get("thumbnail", self.thumbnail_folder)
                     if "filters" in config:
                         self.filter_options = config["filters"]
+                    if "manifest_cache" in config:
+                        self.manifest_cache.update(config["manifest_cache"])
+                    if "search_cache" in config:
+                        self.search_cache.update(config["search_cache"])
+                    if "segmented_download" in config:
+                        self.segmented_download.update(config["segmented_download"])
+                    if "media_pipeline" in config:
+                        self.media_pipeline.update(config["media_pipeline"])
+                    if "governor" in config:
+                        self.governor.update(config["governor"])
+                    if "metrics" in config:
+                        self.metrics.update(config["metrics"])
+                    if "auto_tune" in config:
+                        self.auto_tune.update(config["auto_tune"])
+                    if "daemon" in config:
+                        self.daemon.update(config["daemon"])
 
         except Exception as e:
             print(f"⚠️ Không thể đọc file cấu hình: {str(e)}")
     
-    def save_config(self):
-        """Lưu cấu hình vào file config.json"""
+    def to_dict(self):
+        return {
+            'max_workers': self.max_workers,
+            'preflight_workers': self.preflight_workers,
+            'download_thumbnails': self.download_thumbnails,
+            'folders': {
+                'audio': self.audio_folder,
+                'video': self.video_folder,
+                'thumbnail': self.thumbnail_folder
+            },
+            'filters': self.filter_options,
+            'manifest_cache': self.manifest_cache,
+            'search_cache': self.search_cache,
+            'segmented_download': self.segmented_download,
+            'media_pipeline': self.media_pipeline,
+            'governor': self.governor,
+            'metrics': self.metrics,
+            'auto_tune': self.auto_tune,
+            'daemon': self.daemon
+        }
+
+    def save_config(self, quiet: bool = False):
+        """Lưu cấu hình vào file config.json và báo cho các bên đang dùng cấu hình"""
         try:
-            config = {
-                'max_workers': self.max_workers,
-                'folders': {
-                    'audio': self.audio_folder,
-                    'video': self.video_folder,
-                    'thumbnail': self.thumbnail_folder
-                },
-                'filters': self.filter_options
-            }
-            
+            config = self.to_dict()
+
             os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=4, ensure_ascii=False)
-                
-            print(f"✅ Đã lưu cấu hình vào {self.config_file}")
+            self._loaded_mtime = self._config_mtime()
+
+            if not quiet:
+                print(f"✅ Đã lưu cấu hình vào {self.config_file}")
         except Exception as e:
-            print(f"⚠️ Không thể lưu file cấu hình: {str(e)}")
+            print(f"⚠️ Không thể lưu file cấu hình: {str(e)}", file=sys.stderr if quiet else sys.stdout)
+        # Thay đổi vẫn có hiệu lực trong phiên này dù không lưu được
+        self._notify()
 
     def configure_threading(self):
         """Cấu hình số luồng tối đa"""
@@ -90,7 +255,33 @@ class Configure():
                 print(f"✅ Giữ nguyên số luồng: {self.max_workers}")
         except ValueError:
             print("⚠️ Giá trị không hợp lệ, giữ nguyên số luồng hiện tại.")
-        
+
+        tune = self.auto_tune
+        print(f"\nTự động điều chỉnh số luồng: {'Bật' if tune['enabled'] else 'Tắt'} "
+              f"(trong khoảng {tune['min_workers']}-{tune['max_workers']})")
+        if tune['tuned_workers']:
+            print(f"    Lần trước: {tune['tuned_workers']} luồng, "
+                  f"{tune['tuned_throughput'] / (1024 * 1024):.2f} MB/s")
+        choice = input("Bật tự động điều chỉnh? (y/n, Enter để giữ nguyên): ").strip().lower()
+        if choice in ["y", "n"]:
+            tune['enabled'] = choice == "y"
+            print(f"✅ Đã {'bật' if tune['enabled'] else 'tắt'} tự động điều chỉnh số luồng")
+
+        # Lưu cấu hình sau khi thay đổi
+        self.save_config()
+        input("\nNhấn Enter để tiếp tục...")
+
+    def configure_thumbnails(self):
+        """Bật/tắt tải thumbnail kèm video/audio"""
+        self.header._print_header("Cấu hình thumbnail")
+        print(f"Tải thumbnail: {'Bật' if self.download_thumbnails else 'Tắt'}")
+        choice = input("Bật tải thumbnail? (y/n, Enter để giữ nguyên): ").strip().lower()
+        if choice in ["y", "n"]:
+            self.download_thumbnails = choice == "y"
+            print(f"✅ Đã {'bật' if self.download_thumbnails else 'tắt'} tải thumbnail")
+        else:
+            print("✅ Giữ nguyên cấu hình thumbnail")
+
         # Lưu cấu hình sau khi thay đổi
         self.save_config()
         input("\nNhấn Enter để tiếp tục...")
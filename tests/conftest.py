@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils.config import Configure
+
+
+@pytest.fixture
+def configure(tmp_path, monkeypatch):
+    """A Configure whose project folder (config.json, downloads, cache) lives in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    return Configure()
@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+
+from benchmarks.local_server import LocalStreamServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Chạy youtube_download.main với YouTube giả trỏ tới máy chủ cục bộ
+DRIVER = """
+import sys
+sys.path.insert(0, {root!r})
+from benchmarks.fake_youtube import FakeBackend
+import youtube_download
+with FakeBackend({url!r}, 2 * 1024 * 1024, playlist_size=4).installed():
+    sys.exit(youtube_download.main(sys.argv[1:]))
+"""
+
+
+def test_ctrl_c_prints_the_partial_summary(tmp_path):
+    with LocalStreamServer(0, bandwidth=512 * 1024) as server:
+        process = subprocess.Popen(
+            [sys.executable, "-c", DRIVER.format(root=ROOT, url=server.url),
+             "--json", "--no-progress", "-p", "https://www.youtube.com/playlist?list=PLcli"],
+            cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        video_folder = tmp_path / "youtube_downloader_projects" / "video"
+        deadline = time.time() + 20
+        while not (video_folder.is_dir() and any(name.endswith(".part") for name in os.listdir(video_folder))):
+            assert time.time() < deadline and process.poll() is None
+            time.sleep(0.05)
+        process.send_signal(signal.SIGINT)
+        stdout, stderr = process.communicate(timeout=20)
+
+    assert process.returncode == 130, stderr.decode()
+    summary = json.loads(stdout)
+    assert summary["interrupted"]
+    assert summary["cancelled"] >= 1
+    assert summary["succeeded"] + summary["cancelled"] == summary["total"]
+    assert b"Traceback" not in stderr
+
+
+def test_menu_starts_without_the_download_service(tmp_path):
+    script = (
+        f"import sys; sys.path.insert(0, {ROOT!r})\n"
+        "import youtube_download\n"
+        "screen = youtube_download.YoutubeDownloaderScreen()\n"
+        "screen.resume_unfinished()\n"
+        "print(sorted(name for name in ('pytubefix', 'aiohttp', 'tqdm') if name in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, timeout=30)
+
+    assert result.returncode == 0, result.stderr.decode()
+    assert result.stdout.decode().strip() == "[]"
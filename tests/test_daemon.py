@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from benchmarks.fake_youtube import FakeBackend
+from benchmarks.local_server import LocalStreamServer
+from core.services.jobs import PENDING, DONE
+
+PLAYLIST = ("playlist", "https://www.youtube.com/playlist?list=PLdaemon")
+
+
+@pytest.fixture
+def service(configure, monkeypatch):
+    monkeypatch.setattr("core.utils.config._shared", configure)
+    configure.daemon["max_batches"] = 1
+    configure.max_workers = 2
+    # Chậm vừa đủ để lô còn đang chạy khi bị dừng
+    with LocalStreamServer(0, bandwidth=256 * 1024) as server:
+        backend = FakeBackend(server.url, 1024 * 1024, playlist_size=6)
+        with backend.installed():
+            from core.services.download import DownloadService
+            service = DownloadService()
+            yield service
+            service.engine.close()
+
+
+def _wait(condition, timeout: float = 10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+
+def test_batches_beyond_the_limit_are_queued(service):
+    from core.services.daemon import DownloadDaemon
+
+    daemon = DownloadDaemon(service, port=0)
+    first = daemon.submit([PLAYLIST])
+    second = daemon.submit([PLAYLIST])
+    _wait(lambda: daemon.health()["running"] == [first])
+
+    assert daemon.health()["queued"] == [second]
+    assert daemon.batch_status(second, items=False)["state"] == "queued"
+    assert len(daemon._runners) == 1
+    daemon.stop()
+
+
+def test_stop_cancels_running_batches_and_releases_their_leases(service):
+    from core.services.daemon import DownloadDaemon
+
+    daemon = DownloadDaemon(service, port=0)
+    first = daemon.submit([PLAYLIST])
+    second = daemon.submit([PLAYLIST])
+    _wait(lambda: service.jobs.counts(first).get("downloading"))
+
+    started = time.time()
+    daemon.stop()
+
+    assert time.time() - started < 5
+    assert not any(runner.is_alive() for runner in daemon._runners)
+    for batch_id in (first, second):
+        job_batch = service.jobs.batch(batch_id)
+        assert job_batch["owner"] is None and job_batch["lease_until"] is None
+        assert job_batch["finished_at"] is None
+    # Mục đang tải quay về chờ, lần chạy sau tiếp tục từ tệp .part
+    assert set(service.jobs.counts(first)) <= {PENDING, DONE}
+    assert service.jobs.claim(first) is not None
@@ -0,0 +1,132 @@
+import os
+import sys
+
+import pytest
+
+from benchmarks.fake_youtube import FakeBackend
+from benchmarks.local_server import LocalStreamServer
+
+FIRST = "https://www.youtube.com/watch?v=aaaaaaaaaaa"
+SECOND = "https://www.youtube.com/watch?v=bbbbbbbbbbb"
+
+
+class SameTitleBackend(FakeBackend):
+    """Every video has the same title, as reuploads and generic titles do."""
+
+    def title(self, video_id: str):
+        return "Same title"
+
+
+@pytest.fixture
+def server():
+    with LocalStreamServer(0) as server:
+        yield server
+
+
+@pytest.fixture
+def make_service(configure, monkeypatch, server):
+    monkeypatch.setattr("core.utils.config._shared", configure)
+    services = []
+
+    def make(backend_class=FakeBackend, video_size: int = 256 * 1024, audio_size: int = None):
+        backend = backend_class(server.url, video_size, audio_size=audio_size)
+        installed = backend.installed()
+        installed.__enter__()
+        from core.services.download import DownloadService
+        service = DownloadService()
+        services.append((service, installed))
+        return service, backend
+
+    yield make
+    for service, installed in services:
+        service.engine.close()
+        installed.__exit__(None, None, None)
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """Stands in for ffmpeg: copies its first input to the output path it is given last."""
+    path = tmp_path / "ffmpeg"
+    path.write_text(
+        f"#!{sys.executable}\n"
+        "import shutil, sys\n"
+        "shutil.copyfile(sys.argv[sys.argv.index('-i') + 1], sys.argv[-1])\n"
+    )
+    path.chmod(0o755)
+    return str(path)
+
+
+def _archived_paths(service, type_download: str):
+    return {
+        video_id: service.archive.find(video_id, type_download)["path"]
+        for video_id in ("aaaaaaaaaaa", "bbbbbbbbbbb")
+    }
+
+
+def test_transcoded_same_title_videos_are_not_skipped(make_service, fake_ffmpeg):
+    service, _ = make_service(SameTitleBackend, audio_size=64 * 1024)
+    service.media.ffmpeg = fake_ffmpeg
+
+    first = service.download_targets([("url", FIRST)], "audio", show_progress=False)
+    second = service.download_targets([("url", SECOND)], "audio", show_progress=False)
+
+    assert first["succeeded"] == 1 and second["succeeded"] == 1
+    paths = _archived_paths(service, "audio")
+    assert paths["aaaaaaaaaaa"] != paths["bbbbbbbbbbb"]
+    assert all(os.path.isfile(path) for path in paths.values())
+
+
+def test_concurrent_same_title_parts_do_not_collide(make_service, fake_ffmpeg):
+    service, _ = make_service(SameTitleBackend, audio_size=64 * 1024)
+    service.media.ffmpeg = fake_ffmpeg
+
+    summary = service.download_targets([("url", FIRST), ("url", SECOND)], "audio", show_progress=False)
+
+    assert summary["succeeded"] == 2
+    paths = _archived_paths(service, "audio")
+    assert paths["aaaaaaaaaaa"] != paths["bbbbbbbbbbb"]
+    # Không còn tệp trung gian nào sót lại
+    assert sorted(os.listdir(service.audio_folder)) == sorted(os.path.basename(path) for path in paths.values())
+
+
+def test_same_title_videos_do_not_overwrite_each_other(make_service):
+    service, backend = make_service(SameTitleBackend)
+    service.media.ffmpeg = None
+
+    service.download_targets([("url", FIRST)], "video", show_progress=False)
+    # Video thứ hai khác kích thước: trước đây ghi đè tệp của video thứ nhất
+    backend.video_size *= 2
+    service.download_targets([("url", SECOND)], "video", show_progress=False)
+
+    paths = _archived_paths(service, "video")
+    assert paths["aaaaaaaaaaa"] != paths["bbbbbbbbbbb"]
+    # Bản ghi của video thứ nhất vẫn khớp với tệp, lần chạy sau không tải lại
+    assert service.archive.find("aaaaaaaaaaa", "video") is not None
+
+
+def test_keyword_batches_resolve_each_result_once(make_service):
+    service, backend = make_service()
+
+    summary = service.download_targets([("keyword", "test")], "video", keyword_limit=5, show_progress=False)
+
+    assert summary["succeeded"] == 5
+    # Một yêu cầu player cho mỗi video, do manifest cache gửi; trang kết quả không gửi thêm
+    assert backend.player_requests == 5
+
+
+def test_downloading_items_do_not_hold_scheduler_threads(make_service, server, monkeypatch):
+    from core.services import download
+    monkeypatch.setattr(download, "HANDOFF_WORKERS", 1)
+    # Mỗi mục tải mất khoảng một giây, đủ để các mục chạy chồng lên nhau
+    server.httpd.bandwidth = 256 * 1024
+    service, backend = make_service()
+    backend.playlist_size = 4
+    service.budget.set_limit(4)
+    service.budget.take_peak()
+
+    summary = service.download_targets([("playlist", "https://www.youtube.com/playlist?list=PLhandoff")],
+                                       "video", show_progress=False)
+
+    assert summary["succeeded"] == 4
+    # Một luồng điều phối mà vẫn tải đủ 4 mục cùng lúc
+    assert service.budget.take_peak() == 4
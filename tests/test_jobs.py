@@ -0,0 +1,110 @@
+import time
+
+from core.services.jobs import JobQueue, PENDING, RESOLVING, DOWNLOADING, DONE
+
+OPTIONS = [(f"https://www.youtube.com/watch?v=v{n:010d}", f"Video {n}") for n in range(50)]
+
+
+def _interrupt(queue, batch_id, options, done):
+    """Run `done` options of a batch, then stop as Ctrl+C would: one job mid-download, lease released."""
+    fed = queue.feed(batch_id, options)
+    for _ in range(done):
+        link, _ = next(fed)
+        queue.set_state(batch_id, link, DONE)
+    link, _ = next(fed)
+    queue.set_state(batch_id, link, DOWNLOADING)
+    fed.close()
+    queue.release(batch_id)
+
+
+def test_explicit_options_survive_an_interrupted_batch(configure):
+    queue = JobQueue(configure)
+    batch_id = queue.create_batch("keyword", "video", options=OPTIONS)
+    _interrupt(queue, batch_id, OPTIONS, done=10)
+
+    job_batch = queue.claim(batch_id)
+    assert job_batch["expanded"]
+    assert job_batch["counts"] == {DONE: 10, PENDING: 40}
+    assert queue.pending(batch_id) == OPTIONS[10:]
+
+    for link, _ in queue.feed(batch_id, queue.pending(batch_id)):
+        queue.set_state(batch_id, link, DONE)
+    queue.close_batch(batch_id)
+    assert queue.batch(batch_id)["finished_at"] is not None
+
+
+def test_interrupted_expansion_is_resumed_from_targets(configure):
+    queue = JobQueue(configure)
+    batch_id = queue.create_batch("targets", "audio", targets=[("keyword", "test")], keyword_limit=50)
+    _interrupt(queue, batch_id, iter(OPTIONS), done=5)
+
+    job_batch = queue.claim(batch_id)
+    assert not job_batch["expanded"]
+    assert job_batch["targets"] == [("keyword", "test")]
+    assert job_batch["counts"] == {DONE: 5, PENDING: 1}
+
+    remaining = list(queue.feed(batch_id, queue.pending(batch_id) + OPTIONS))
+    assert remaining == OPTIONS[5:]
+    assert queue.batch(batch_id)["expanded"]
+
+
+def test_batch_without_targets_is_never_closed_unexpanded(configure):
+    queue = JobQueue(configure)
+    # Lô kiểu cũ: mục được ghi dần qua feed, không có targets
+    batch_id = queue.create_batch("keyword", "video")
+    for link, _ in queue.feed(batch_id, OPTIONS[:3]):
+        queue.set_state(batch_id, link, DONE)
+    queue.close_batch(batch_id)
+
+    job_batch = queue.batch(batch_id)
+    assert not job_batch["expanded"]
+    assert job_batch["finished_at"] is None
+
+
+def test_leased_batch_is_not_recovered_by_another_process(configure):
+    running = JobQueue(configure)
+    other = JobQueue(configure)
+    batch_id = running.create_batch("keyword", "video", options=OPTIONS[:2])
+    running.set_state(batch_id, OPTIONS[0][0], DOWNLOADING)
+    running.set_state(batch_id, OPTIONS[1][0], RESOLVING)
+
+    assert other.claim(batch_id) is None
+    assert other.batch(batch_id)["counts"] == {DOWNLOADING: 1, RESOLVING: 1}
+    assert other.leased(other.batch(batch_id))
+
+
+def test_expired_lease_is_claimed_once(configure):
+    crashed = JobQueue(configure)
+    batch_id = crashed.create_batch("keyword", "video", options=OPTIONS[:2])
+    crashed.set_state(batch_id, OPTIONS[0][0], DOWNLOADING)
+    # Tiến trình chết: không còn ai gia hạn lease
+    crashed._owned.clear()
+    crashed._conn.execute("UPDATE batches SET lease_until = ? WHERE id = ?", (time.time() - 1, batch_id))
+
+    first, second = JobQueue(configure), JobQueue(configure)
+    job_batch = first.claim(batch_id)
+    assert job_batch["owner"] == first.owner
+    assert job_batch["counts"] == {PENDING: 2}
+    assert second.claim(batch_id) is None
+
+
+def test_finished_batch_cannot_be_claimed(configure):
+    queue = JobQueue(configure)
+    batch_id = queue.create_batch("keyword", "video", options=OPTIONS[:1])
+    for link, _ in queue.feed(batch_id, OPTIONS[:1]):
+        queue.set_state(batch_id, link, DONE)
+    queue.close_batch(batch_id)
+    queue.release(batch_id)
+
+    assert queue.claim(batch_id) is None
+    assert queue.unfinished() == []
+
+
+def test_duplicate_options_are_yielded_once(configure):
+    queue = JobQueue(configure)
+    batch_id = queue.create_batch("targets", "video", targets=[("keyword", "test")])
+
+    fed = list(queue.feed(batch_id, OPTIONS[:3] + OPTIONS[1:4] + OPTIONS[:1]))
+
+    assert fed == OPTIONS[:4]
+    assert queue.batch(batch_id)["counts"] == {RESOLVING: 4}
@@ -0,0 +1,82 @@
+import os
+import time
+
+from benchmarks.fake_youtube import FakeBackend, FakeYouTube
+from core.services.manifest import ManifestCache, VideoManifest
+
+URL = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+class SabrYouTube(FakeYouTube):
+    """A video whose streams are SABR, as resolved by pytubefix with a PO token."""
+
+    po_token = "po-token"
+    video_playback_ustreamer_config = "ustreamer-config"
+
+
+class SabrBackend(FakeBackend):
+    """Serves every stream as SABR."""
+
+    def stream_dicts(self, video_id: str):
+        streams = super().stream_dicts(video_id)
+        for data in streams:
+            data["is_sabr"] = True
+        return streams
+
+
+def test_audio_tracks_survive_the_cache():
+    backend = FakeBackend("http://127.0.0.1:1/stream?", 1000)
+    yt = FakeYouTube(backend, URL)
+    dubbed = dict(backend.stream_dicts(yt.video_id)[1], audioTrack={
+        "audioIsDefault": False, "displayName": "German", "id": "de.3",
+    })
+    backend.stream_dicts = lambda video_id: [dubbed]
+
+    manifest = VideoManifest.from_dict(VideoManifest.from_youtube(yt).to_dict())
+    stream = manifest.stream_query().first()
+
+    assert stream.includes_multiple_audio_tracks
+    assert not stream.is_default_audio_track
+    assert stream.audio_track_name == "German"
+    assert stream.audio_track_language_id == "de"
+
+
+def test_sabr_manifests_are_not_cached(configure, monkeypatch):
+    backend = SabrBackend("http://127.0.0.1:1/stream?", 1000)
+    resolved = []
+
+    class YouTube(SabrYouTube):
+        def __init__(self, url, *args, **kwargs):
+            super().__init__(backend, url)
+            resolved.append(self)
+
+    monkeypatch.setattr("core.services.manifest.YouTube", YouTube)
+    cache = ManifestCache(configure)
+
+    manifest = cache.get(URL)
+    stream = manifest.stream_query().first()
+    # Luồng SABR được dựng lại với đủ những gì ServerAbrStream cần
+    assert stream.is_sabr
+    assert stream.po_token == "po-token"
+    assert stream.video_playback_ustreamer_config == "ustreamer-config"
+    assert stream._monostate.youtube is resolved[0]
+
+    cache.get(URL)
+    assert len(resolved) == 2
+    assert not os.listdir(cache.cache_folder)
+
+
+def test_expired_manifests_are_pruned(configure):
+    cache = ManifestCache(configure)
+    expired = os.path.join(cache.cache_folder, "expired0000.json")
+    fresh = os.path.join(cache.cache_folder, "fresh000000.json")
+    leftover = os.path.join(cache.cache_folder, "fresh000000.json.123.tmp")
+    for path in (expired, fresh, leftover):
+        with open(path, "w") as f:
+            f.write("{}")
+    old = time.time() - cache.ttl - 60
+    os.utime(expired, (old, old))
+
+    ManifestCache(configure)
+
+    assert os.listdir(cache.cache_folder) == ["fresh000000.json"]
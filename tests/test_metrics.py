@@ -0,0 +1,31 @@
+from core.services.metrics import BatchMetrics, PercentileSketch
+
+
+def test_sketch_memory_is_bounded():
+    sketch = PercentileSketch(size=100)
+    for value in range(10000):
+        sketch.add(value)
+
+    assert sketch.count == 10000
+    assert len(sketch.values) == 100
+    # Mẫu đều: trung vị ước lượng nằm gần trung vị thật
+    assert 2500 < sketch.percentile(0.5) < 7500
+
+
+def test_batch_summary_counts_finished_items():
+    seen = []
+    batch = BatchMetrics("test", on_finish=seen.append)
+    for n, status in enumerate(("succeeded", "succeeded", "skipped", "failed")):
+        item = batch.new_item(f"https://www.youtube.com/watch?v=v{n:010d}", "video")
+        item.mark_resolved()
+        item.bytes = 100
+        item.finish(status)
+    batch.new_item("https://www.youtube.com/watch?v=pending0000", "video")
+
+    summary = batch.summary()
+
+    assert summary["items"] == 5
+    assert (summary["succeeded"], summary["skipped"], summary["failed"]) == (2, 1, 1)
+    assert summary["bytes"] == 400
+    assert summary["resolve_p50_s"] is not None
+    assert len(seen) == 4
@@ -0,0 +1,40 @@
+from core.services.progress import ProgressRenderer
+
+
+def test_bytes_reported_just_before_close_are_counted():
+    progress = ProgressRenderer(disable=True, on_tick=lambda snapshot: None)
+    progress._stop.set()
+    progress._thread.join()
+
+    task = progress.task("item", 300)
+    task.update(100)
+    drain = task.drain
+
+    def drain_then_finish():
+        added = drain()
+        # Luồng tải gửi khối cuối rồi close() ngay sau khi renderer vừa lấy số đếm
+        task.update(200)
+        task.close()
+        return added
+
+    task.drain = drain_then_finish
+    progress._render()
+    task.drain = drain
+    progress._render()
+
+    assert progress.n == 300
+    assert progress._tasks == []
+
+
+def test_snapshot_counts_every_task():
+    snapshots = []
+    with ProgressRenderer(disable=True, on_tick=snapshots.append) as progress:
+        for i in range(4):
+            with progress.task(f"item {i}", 1000) as task:
+                for _ in range(10):
+                    task.update(100)
+        progress.update(50)
+
+    assert progress.n == 4050
+    assert snapshots[-1]["bytes"] == 4050
+    assert snapshots[-1]["items"] == []
@@ -0,0 +1,72 @@
+from pytubefix import Search
+from pytubefix.contrib.search import Filter
+
+from benchmarks.fake_youtube import FakeBackend, FakeSearch
+from core.services.search import SearchCache, SearchResults
+
+
+def test_filters_are_off_by_default(configure):
+    assert SearchCache(configure)._filters() is None
+
+
+def test_enabled_filters_are_translated_for_pytubefix(configure):
+    configure.filter_options.update(enabled=True)
+    filters = SearchCache(configure)._filters()
+
+    assert filters == {
+        'upload_date': Filter.get_upload_date('Today'),
+        'type': Filter.get_type('Video'),
+        'duration': Filter.get_duration('Under 4 minutes'),
+        'features': [Filter.get_features('4K'), Filter.get_features('Creative Commons')],
+        'sort_by': Filter.get_sort_by('Upload date'),
+    }
+    # Search mã hoá bộ lọc ngay khi khởi tạo, chưa gửi yêu cầu nào
+    assert Search("test", filters=filters).filter
+
+
+def test_unknown_filter_values_are_skipped(configure):
+    configure.filter_options = {
+        'enabled': True,
+        'upload_date': 'Yesterday',
+        'type': 'Video',
+        'features': ['HD', 'Smell-O-Vision'],
+        'sort_by': None,
+    }
+    filters = SearchCache(configure)._filters()
+
+    assert filters == {'type': {2: 1}, 'features': [{4: 1}]}
+    assert Search("test", filters=filters).filter
+
+
+def test_only_unknown_values_means_no_filters(configure):
+    configure.filter_options = {'enabled': True, 'type': 'Podcast', 'features': 'Smell-O-Vision'}
+    assert SearchCache(configure)._filters() is None
+
+
+class _CountingGovernor:
+    def __init__(self):
+        self.calls = 0
+
+    def call(self, fn, **kwargs):
+        self.calls += 1
+        return fn()
+
+
+def test_pages_load_without_player_requests_until_warmed():
+    backend = FakeBackend("http://127.0.0.1:9", video_size=1, search_page_size=5)
+    governor = _CountingGovernor()
+    results = SearchResults(FakeSearch(backend, "test"), workers=4, governor=governor)
+    results.load_more()
+    results.load_more()
+
+    assert len(results.videos) == 10
+    assert all(yt._vid_info is None for yt in results.videos)
+
+    results.warm(3)
+    results.warm(3)
+    assert [yt._vid_info is not None for yt in results.videos[:4]] == [True, True, True, False]
+    assert governor.calls == 3
+
+    results.warm()
+    assert governor.calls == 10
+    assert all(yt._vid_info is not None for yt in results.videos)
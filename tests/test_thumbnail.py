@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from benchmarks.local_server import LocalStreamServer
+from core.services.engine import AsyncTransferEngine
+from core.services.thumbnail import ThumbnailFetcher
+
+VIDEO_ID = "abcdefghijk"
+
+
+@pytest.fixture
+def fetcher(configure):
+    engine = AsyncTransferEngine()
+    yield ThumbnailFetcher(configure, engine)
+    engine.close()
+
+
+def test_finished_fetches_are_not_kept_queued(fetcher, configure):
+    with LocalStreamServer(1024) as server:
+        fetcher.fetch(VIDEO_ID, server.url).result(timeout=10)
+
+    assert not fetcher._queued
+    assert os.listdir(configure.thumbnail_folder) == [f"{VIDEO_ID}.jpg"]
+    assert fetcher.fetch(VIDEO_ID, server.url) is None
+
+
+def test_failed_fetch_can_be_retried(fetcher, monkeypatch):
+    # Không máy chủ nào nghe ở cổng 1, và không thử các URL dự phòng trên i.ytimg.com
+    monkeypatch.setattr(fetcher, "_candidates", lambda video_id, thumbnail_url=None: [thumbnail_url])
+    future = fetcher.fetch(VIDEO_ID, "http://127.0.0.1:1/thumbnail.jpg")
+    with pytest.raises(Exception):
+        future.result(timeout=30)
+
+    assert not fetcher._queued
+    assert fetcher.fetch(VIDEO_ID, "http://127.0.0.1:1/thumbnail.jpg") is not None
@@ -0,0 +1,138 @@
+import os
+import threading
+
+import pytest
+
+from benchmarks.local_server import LocalStreamServer, _StreamHandler
+from core.services.engine import AsyncTransferEngine, WRITE_SIZE
+from core.services.transfer import (
+    JOURNAL_INTERVAL, JOURNAL_SECONDS, MIN_PIECE_SIZE, READ_SIZE, PartialJournal, TransferCancelled, TransferError,
+    finalize_part, open_part
+)
+
+SIZE = 4 * 1024 * 1024
+
+
+class _NoRangeHandler(_StreamHandler):
+    """A server that ignores `Range` and always answers 200 with the whole file."""
+
+    def _requested_range(self, size: int):
+        return None
+
+
+@pytest.fixture
+def engine():
+    engine = AsyncTransferEngine(chunk_size=MIN_PIECE_SIZE)
+    yield engine
+    engine.close()
+
+
+@pytest.fixture
+def server():
+    with LocalStreamServer(SIZE, bandwidth=4 * 1024 * 1024) as server:
+        yield server
+
+
+def _interrupt(engine, server, file_path: str, after: int, connections: int = 2):
+    """Start a download and cancel it once `after` bytes arrived, as Ctrl+C would."""
+    cancelled = threading.Event()
+    received = [0]
+
+    def on_progress(n):
+        received[0] += n
+        if received[0] >= after:
+            cancelled.set()
+
+    with pytest.raises(TransferCancelled):
+        engine.download(server.url, file_path, SIZE, on_progress, connections=connections, cancelled=cancelled)
+
+
+def test_interrupted_download_resumes_to_an_identical_file(engine, server, tmp_path):
+    file_path = str(tmp_path / "video.mp4")
+    _interrupt(engine, server, file_path, SIZE // 3)
+
+    assert not os.path.exists(file_path)
+    journal = PartialJournal(f"{file_path}.part.json", SIZE).load()
+    assert 0 < journal.completed < SIZE
+    # Mọi byte journal ghi nhận đều đã nằm đúng chỗ trong tệp .part
+    with open(f"{file_path}.part", "rb") as f:
+        part = f.read()
+    for start, end in journal.ranges:
+        assert part[start:end] == server.payload[start:end]
+
+    progress = []
+    engine.download(server.url, file_path, SIZE, progress.append, connections=2)
+
+    with open(file_path, "rb") as f:
+        assert f.read() == server.payload
+    assert sum(progress) == SIZE
+    assert progress[0] == journal.completed
+    assert not os.path.exists(f"{file_path}.part")
+    assert not os.path.exists(f"{file_path}.part.json")
+
+
+def test_incomplete_part_is_not_finalized(tmp_path):
+    file_path = str(tmp_path / "video.mp4")
+    part_path, journal = open_part(file_path, SIZE)
+    with open(part_path, "r+b") as f:
+        f.truncate(SIZE)
+    journal.add(0, SIZE - 1)
+
+    with pytest.raises(TransferError, match=f"{SIZE - 1}/{SIZE}"):
+        finalize_part(file_path, part_path, journal, SIZE)
+    assert os.path.exists(part_path)
+    assert not os.path.exists(file_path)
+
+
+def test_size_mismatch_is_rejected(engine, server, tmp_path):
+    # Máy chủ chỉ có SIZE byte nhưng manifest khai báo nhiều hơn
+    file_path = str(tmp_path / "video.mp4")
+
+    with pytest.raises(TransferError):
+        engine.download(server.url, file_path, SIZE + MIN_PIECE_SIZE)
+    assert not os.path.exists(file_path)
+
+
+def test_full_response_is_rejected_when_resuming(engine, server, tmp_path):
+    file_path = str(tmp_path / "video.mp4")
+    _interrupt(engine, server, file_path, SIZE // 3, connections=1)
+    completed = PartialJournal(f"{file_path}.part.json", SIZE).load().completed
+
+    server.httpd.RequestHandlerClass = _NoRangeHandler
+    with pytest.raises(TransferError) as raised:
+        engine.download(server.url, file_path, SIZE)
+
+    assert raised.value.status == 200
+    assert not os.path.exists(file_path)
+    # Không byte nào của phản hồi 200 bị ghi đè lên phần đã tải
+    assert PartialJournal(f"{file_path}.part.json", SIZE).load().completed == completed
+
+
+def test_full_response_is_accepted_from_the_start(server, tmp_path):
+    file_path = str(tmp_path / "video.mp4")
+    server.httpd.RequestHandlerClass = _NoRangeHandler
+
+    # Cả tệp nằm trong một range duy nhất, bắt đầu từ byte 0
+    engine = AsyncTransferEngine()
+    try:
+        engine.download(server.url, file_path, SIZE)
+    finally:
+        engine.close()
+
+    with open(file_path, "rb") as f:
+        assert f.read() == server.payload
+
+
+def test_journal_is_not_saved_after_every_write(tmp_path, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("core.services.transfer.time.monotonic", lambda: now[0])
+    journal = PartialJournal(str(tmp_path / "video.mp4.part.json"), 64 * WRITE_SIZE)
+
+    writes = [journal.add(n * WRITE_SIZE, (n + 1) * WRITE_SIZE) for n in range(JOURNAL_INTERVAL // WRITE_SIZE)]
+    # Mỗi lần fsync phủ nhiều lần ghi, không phải từng lần một
+    assert writes[-1] and not any(writes[:-1])
+
+    journal.save()
+    now[0] += JOURNAL_SECONDS
+    # Kết nối chậm: sau JOURNAL_SECONDS, một lần ghi nhỏ cũng được ghi journal
+    assert journal.add(JOURNAL_INTERVAL, JOURNAL_INTERVAL + READ_SIZE)
@@ -0,0 +1,79 @@
+import json
+from contextlib import ExitStack
+
+import pytest
+
+from core.services.batch import WorkerBudget
+from core.services.transfer import TransferError
+from core.services.tuner import ConcurrencyTuner, HOLD_WINDOWS
+from core.utils.config import Configure
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def tuner(configure):
+    configure.auto_tune.update(enabled=True, min_workers=1, max_workers=8, error_threshold=3, min_gain=0.05)
+    return ConcurrencyTuner(configure, WorkerBudget(4))
+
+
+def window(tuner, received: int, busy: int = None, retries: int = 0, throttled: int = 0):
+    """Run one one-second measurement window: `busy` slots in use (all by default) and `received` bytes."""
+    with ExitStack() as stack:
+        for _ in range(tuner.budget.limit if busy is None else busy):
+            stack.enter_context(tuner.budget)
+    tuner.add_bytes(received)
+    for _ in range(retries):
+        tuner.on_retry(TransferError("HTTP 503", status=503))
+    for _ in range(throttled):
+        tuner.on_retry(TransferError("HTTP 429", status=429))
+    return tuner.step(1.0)
+
+
+def test_limit_grows_only_while_every_slot_is_busy(tuner):
+    assert window(tuner, MB) == 5
+    assert window(tuner, 2 * MB) == 6
+    # Còn slot rảnh: không có lý do tăng
+    assert window(tuner, 3 * MB, busy=3) == 6
+
+
+def test_throttling_halves_the_limit_and_holds_it(tuner):
+    assert window(tuner, MB, throttled=1) == 2
+    for _ in range(HOLD_WINDOWS):
+        assert window(tuner, MB) == 2
+    assert window(tuner, MB) == 3
+
+
+def test_retry_burst_halves_the_limit(tuner):
+    assert window(tuner, MB, retries=2) == 5
+    assert window(tuner, MB, retries=3) == 2
+
+
+def test_increase_without_gain_is_taken_back(tuner):
+    assert window(tuner, 10 * MB) == 5
+    # Thông lượng không tăng đủ min_gain với 5 luồng: quay về 4 và giữ nguyên
+    assert window(tuner, 10 * MB) == 4
+    for _ in range(HOLD_WINDOWS):
+        assert window(tuner, 10 * MB) == 4
+
+
+def test_limit_stays_within_bounds(tuner):
+    tuner.configure.auto_tune.update(min_workers=3, max_workers=4)
+    assert window(tuner, MB) == 4
+    assert window(tuner, MB, throttled=1) == 3
+
+
+def test_best_limit_is_saved_for_the_next_run(tuner, configure):
+    window(tuner, 10 * MB)
+    window(tuner, 20 * MB)
+    window(tuner, 20 * MB)
+    # Cửa sổ có lỗi không được tính là tốt nhất dù thông lượng cao
+    window(tuner, 50 * MB, throttled=1)
+    assert tuner.best == (5, 20 * MB)
+
+    tuner._save()
+
+    with open(configure.config_file, encoding="utf-8") as f:
+        saved = json.load(f)["auto_tune"]
+    assert saved["tuned_workers"] == 5
+    assert ConcurrencyTuner(Configure(), WorkerBudget(1)).initial_limit() == 5
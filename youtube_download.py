@@ -1,17 +1,32 @@
+import sys
+import json
+import signal
+import argparse
+import threading
 import traceback
 from core.utils.config import Configure
 from core.header import Header
-from core.screens.settings import SettingScreen
-from core.services.download import DownloadService
+from core.misc.targets import classify_target
 
 class YoutubeDownloaderScreen():
     def __init__(self):
-        self.configure = Configure()
+        self.configure = Configure.shared()
         self.header = Header()
-        self.download_service = DownloadService()
+        self._download_service = None
+
+    @property
+    def download_service(self):
+        # Tạo khi lần đầu tải: nạp pytubefix/aiohttp/tqdm, mở các cơ sở dữ liệu và dọn cache,
+        # để menu hiện ra ngay
+        if self._download_service is None:
+            from core.services.download import DownloadService
+            self._download_service = DownloadService()
+        return self._download_service
 
     def main(self):
+        from core.screens.settings import SettingScreen
         while True:
+            self.configure.reload_if_changed()
             self.header._print_header("Main screen")
             print(" [1] Download video/audio from URL")
             print(" [2] Download playlist from URL")
@@ -32,7 +47,7 @@ class YoutubeDownloaderScreen():
             if choice == "1":
                 self.download_service.download_video_audio_from_url()
             elif choice == "2":
-                self.download_playlist()
+                self.download_service.download_playlist()
             elif choice == "3":
                 self.download_service.download_from_keyword()
             elif choice == "4":
@@ -46,9 +61,26 @@ class YoutubeDownloaderScreen():
                 print("❌ Lựa chọn không hợp lệ. Vui lòng thử lại.")
                 input("\nNhấn Enter để tiếp tục...")
 
+    def resume_unfinished(self):
+        """Finish batches left over from an interrupted run before showing the menu."""
+        from core.services.jobs import JobQueue
+        # Chỉ đọc hàng đợi; service chỉ được tạo khi thật sự có lô cần tiếp tục
+        jobs = JobQueue(self.configure)
+        try:
+            if not jobs.unfinished():
+                return
+        finally:
+            jobs.close()
+        summaries = self.download_service.resume_jobs()
+        for summary in summaries:
+            print(f"✅ Thành công: {summary['succeeded']} | Bỏ qua: {summary['skipped']} | Lỗi: {summary['failed']}")
+        if summaries:
+            input("\nNhấn Enter để tiếp tục...")
+
     def run(self):
         try:
             self.header._print_header("Starting...")
+            self.resume_unfinished()
             self.main()
         except KeyboardInterrupt:
             print("\n\n🛑 Chương trình bị ngắt bởi người dùng...")
@@ -61,6 +93,160 @@ class YoutubeDownloaderScreen():
         finally:
             print("\nĐóng chương trình.")
 
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Download YouTube videos/audio without the interactive screens. "
+                    "Run without arguments to open the interactive menu.",
+        epilog="Exit codes: 0 all items succeeded or were skipped, 1 some item or target failed, "
+               "2 bad arguments, 130 interrupted by Ctrl+C (the summary lists the cancelled items, "
+               "which resume on the next run)."
+    )
+    parser.add_argument("targets", nargs="*", help="video URLs, playlist URLs or keywords")
+    parser.add_argument("-p", "--playlist", action="append", default=[], help="playlist URL (repeatable)")
+    parser.add_argument("-k", "--keyword", action="append", default=[], help="search keyword (repeatable)")
+    parser.add_argument("-f", "--batch-file", help="file with one URL, playlist URL or keyword per line ('-' for stdin)")
+    parser.add_argument("-t", "--type", choices=["video", "audio"], default="video", help="download type (default: video)")
+    parser.add_argument("-q", "--quality", default="highest",
+                        help="'highest', a video resolution such as 720p, or an audio bitrate such as 128kbps")
+    parser.add_argument("-n", "--limit", type=int, default=None, help="max results per keyword")
+    parser.add_argument("--thumbnails", action="store_true", help="also save each video's thumbnail")
+    parser.add_argument("--json", action="store_true", help="print a JSON summary to stdout")
+    parser.add_argument("--no-progress", action="store_true", help="hide the progress bar")
+    parser.add_argument("--resume", action="store_true",
+                        help="only finish batches left unfinished by an earlier run")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="do not finish unfinished batches before the new targets")
+    parser.add_argument("--daemon", action="store_true",
+                        help="run as a long-lived local service with an HTTP API for submitting jobs")
+    parser.add_argument("--host", help="daemon listen address (default from config, 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="daemon listen port (default from config, 8765)")
+    return parser
+
+
+def read_batch_file(path: str):
+    handle = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        for line in handle:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield classify_target(line)
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+# Mã thoát của chế độ không tương tác
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def run_headless(args):
+    """
+    Download everything given on the command line, after finishing any batch
+    an earlier run left unfinished.
+
+    Ctrl+C cancels the running batch: items in flight stop, the summary of
+    what was done so far is still printed, and the unfinished items resume
+    on the next run. A second Ctrl+C exits at once.
+
+    Exit codes: 0 when every item succeeded or was skipped, 1 when anything
+    failed, 2 for bad arguments, 130 when interrupted by Ctrl+C (cancelled
+    items count as not done).
+    """
+    targets = [classify_target(value) for value in args.targets]
+    targets += [("playlist", value) for value in args.playlist]
+    targets += [("keyword", value) for value in args.keyword]
+    if args.batch_file:
+        targets += list(read_batch_file(args.batch_file))
+    if not targets and not args.resume:
+        print("❌ Không có URL, playlist hoặc keyword nào để tải.", file=sys.stderr)
+        return EXIT_USAGE
+
+    cancelled = threading.Event()
+
+    def on_interrupt(signum, frame):
+        # Lần đầu: huỷ lô và vẫn in tóm tắt; lần thứ hai: thoát ngay
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        cancelled.set()
+        print("\n🛑 Đang dừng, các mục dang dở sẽ được tiếp tục ở lần chạy sau (Ctrl+C lần nữa để thoát ngay)...",
+              file=sys.stderr)
+
+    signal.signal(signal.SIGINT, on_interrupt)
+
+    from core.services.download import DownloadService
+    service = DownloadService()
+    # Chỉ áp dụng cho lần chạy này, không ghi vào config.json
+    thumbnails = True if args.thumbnails else None
+    resumed = [] if args.no_resume else service.resume_jobs(show_progress=not args.no_progress,
+                                                            thumbnails=thumbnails, cancelled=cancelled)
+    summaries = list(resumed)
+    if targets and not cancelled.is_set():
+        summary = service.download_targets(
+            targets,
+            type_download=args.type,
+            quality=args.quality,
+            keyword_limit=args.limit,
+            show_progress=not args.no_progress,
+            thumbnails=thumbnails,
+            cancelled=cancelled
+        )
+        summaries.append(summary)
+        output = dict(summary, resumed=resumed)
+    else:
+        output = {"resumed": resumed}
+    output["interrupted"] = cancelled.is_set()
+    if args.json:
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+    else:
+        for summary in summaries:
+            for link, title, error in service.jobs.failed(summary["batch_id"]):
+                print(f"❌ {title or link}: {error}", file=sys.stderr)
+            for error in summary["target_errors"]:
+                print(f"❌ {error['target']}: {error['error']}", file=sys.stderr)
+            print(f"✅ Thành công: {summary['succeeded']} | Bỏ qua: {summary['skipped']} | Lỗi: {summary['failed']}"
+                  f" | Đã huỷ: {summary['cancelled']}")
+    if cancelled.is_set():
+        return EXIT_INTERRUPTED
+    if any(summary["failed"] or summary["cancelled"] or summary["target_errors"] for summary in summaries):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def run_daemon(args):
+    """Serve the job API until Ctrl+C; unfinished batches resume on the next start."""
+    from core.services.daemon import DownloadDaemon
+    daemon = DownloadDaemon(host=args.host, port=args.port, thumbnails=True if args.thumbnails else None)
+    try:
+        daemon.start()
+    except OSError as e:
+        print(f"❌ Không thể mở {daemon.host}:{daemon.port}: {str(e)}", file=sys.stderr)
+        return 2
+    print(f"🛰️ Daemon đang chạy tại {daemon.url} (Ctrl+C để dừng)", file=sys.stderr)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Dừng daemon, các lô dang dở sẽ được tiếp tục ở lần chạy sau.", file=sys.stderr)
+    finally:
+        daemon.stop()
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        YoutubeDownloaderScreen().run()
+        return 0
+    args = build_parser().parse_args(argv)
+    if args.daemon:
+        return run_daemon(args)
+    try:
+        return run_headless(args)
+    except KeyboardInterrupt:
+        # Ctrl+C lần thứ hai: không chờ các mục đang dừng
+        print("\n🛑 Đã thoát.", file=sys.stderr)
+        return EXIT_INTERRUPTED
+
 if __name__ == "__main__":
-    translator = YoutubeDownloaderScreen()
-    translator.run()
\ No newline at end of file
+    sys.exit(main())